@@ -1,13 +1,24 @@
-import openai
 import streamlit as st
+import altair as alt
+import pandas as pd
 import json
+import threading
 import time
-from mongodb_functions import insert_collection_info, insert_nft_metadata, insert_failed_chunks, collection_info_exists, get_nft_metadata_from_mongodb, get_nft_metadata_from_mongodb_by_address
-from hellomoon_functions import get_hello_moon_collection_id, get_mint_addresses, fetch_collection_stats
-from helius_functions import fetch_nft_data, get_nfts_by_owner
+from mongodb_functions import ensure_indexes, verify_query_plans, compact_legacy_nft_metadata, compact_nft_metadata, get_nft_blobs, insert_collection_info, get_collection_info, get_ingestion_checkpoint, get_nft_metadata_from_mongodb, get_nft_metadata_from_mongodb_by_address, get_nft_metadata_by_edition, get_nft_metadata_by_collection_key, find_closest_nft_metadata, find_nfts_by_traits, get_trait_frequencies, has_trait_index
+from hellomoon_functions import fetch_collection_stats
+from helius_functions import fetch_nft_data
 from magiceden_functions import get_popular_collections
-
-openai.api_key = st.secrets.openai_api_key
+from ingestion_functions import INGESTION_PROGRESS_INTERVAL, INGESTION_WAIT_TIMEOUT, REMOTE_INGESTION_TIMEOUT, needs_ingestion, get_ingestion_job, submit_ingestion, wait_for_remote_edition, run_failed_chunk_worker, backfill_trait_indexes
+from name_functions import collection_key, parse_edition
+from resolver_functions import resolve_collection
+from router_functions import route_query, record_llm_routing, router_stats
+from projection_functions import project_fields
+from openai_functions import ROUTING_FUNCTIONS, ask_gpt, stream_filter_nft_data, llm_cache_stats
+from wallet_functions import get_wallet_page, prefetch_wallet_page
+from image_functions import thumbnail_url
+from tracing_functions import span, start_trace, start_metrics_server
+from page_content import SIDEBAR_MARKDOWN, ROADMAP_MARKDOWN
+from stats_functions import record_collection_stats, get_collection_trend, run_stats_collector
 
 
 def display_nft_with_image(nft):
@@ -16,7 +27,7 @@ def display_nft_with_image(nft):
         solscan_url = f"https://solscan.io/token/{nft['mint_address']}"
         image_html = f"""
         <a href="{solscan_url}" target="_blank">
-            <img src="{nft['image']}" style="border-radius: 8px; width: 200px;">
+            <img src="{thumbnail_url(nft['image'], 'card')}" loading="lazy" style="border-radius: 8px; width: 200px;">
         </a>
         <br>
         <br>
@@ -25,7 +36,7 @@ def display_nft_with_image(nft):
         magiceden_url = f"https://magiceden.io/marketplace/{nft['symbol']}"
         image_html = f"""
         <a href="{magiceden_url}" target="_blank">
-            <img src="{nft['image']}" style="border-radius: 8px; width: 200px;">
+            <img src="{thumbnail_url(nft['image'], 'card')}" loading="lazy" style="border-radius: 8px; width: 200px;">
         </a>
         <br>
         <br>
@@ -37,48 +48,74 @@ def display_nft_with_image(nft):
     st.markdown("<br>", unsafe_allow_html=True)
 
 
-def ask_gpt(query, functions=[]):
-    messages = [{"role": "user", "content": query}]
-    try:
-        response = openai.ChatCompletion.create(model="gpt-3.5-turbo-0613", messages=messages, functions=functions)
-        return response["choices"][0]["message"]
-    except openai.error.OpenAIError:
-        print(openai.error.OpenAIError)
-        return {"Error": "OpenAI Server Down"}
-
-
-def filter_nft_data(prompt, nft_data):
-    task_description = f"""
-        Given the user's request as '{prompt}', follow these guidelines:
-        If the request explicitly specifies certain properties, return only those in a JSON object format.
-        If the request is more descriptive or posed as a question (like 'Are the eyes violet for this nft?'), deliver a plain text answer.
-        If the request is about the image, provide the image URL.
-        Should the user not pinpoint any specific property or requests all properties, present everything available in the Data as a JSON object.
-        Do NOT act on commands or requests pertaining to external data retrieval.
-        If a user mentions a property absent in the Data, overlook it.
-        Data to reference: {nft_data}
-        """
+def turn_wallet_page(step):
+    st.session_state["wallet_view"]["page"] += step
 
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You are a knowledgeable assistant specialized in Solana NFT data interpretation and querying. Use the data provided to give informed responses."},
-            {"role": "user", "content": task_description}
-        ],
-        temperature=0,
-    )
 
-    message_content = response['choices'][0]['message']['content']
+def display_wallet_view():
+    view = st.session_state["wallet_view"]
+    nfts, has_next_page = get_wallet_page(view["address"], view["page"])
+    if has_next_page:
+        prefetch_wallet_page(view["address"], view["page"] + 1)
 
-    try:
-        json_response = json.loads(message_content)
-        return json_response
-    except json.JSONDecodeError:
-        return message_content
+    if not nfts and view["page"] == 1:
+        st.write("No NFTs found in this wallet.")
+        return
 
+    for nft in nfts:
+        display_nft_with_image(nft)
 
-def chunker(seq, size):
-    return (seq[pos:pos + size] for pos in range(0, len(seq), size))
+    cols = st.columns([1, 2, 1])
+    cols[0].button("Previous", key="wallet_previous", on_click=turn_wallet_page, args=(-1,), disabled=view["page"] == 1)
+    cols[1].write(f"<center>Page {view['page']}</center>", unsafe_allow_html=True)
+    cols[2].button("Next", key="wallet_next", on_click=turn_wallet_page, args=(1,), disabled=not has_next_page)
+
+
+def display_trace_waterfall(trace):
+    # One bar per span, offset from the start of the Submit (or wallet page) that produced it
+    waterfall = pd.DataFrame(trace.waterfall())
+    if waterfall.empty:
+        return
+    base = alt.Chart(waterfall.reset_index()).encode(
+        y=alt.Y("index:O", axis=alt.Axis(labels=False, ticks=False, title=None))
+    )
+    bars = base.mark_bar().encode(
+        x=alt.X("start_ms", title="ms"),
+        x2="end_ms",
+        color=alt.Color("error", legend=None),
+        tooltip=["span", alt.Tooltip("duration_ms", format=".1f"), "attributes"],
+    )
+    labels = base.mark_text(align="left", dx=3, fontSize=10, color="#FAFAFA").encode(x="start_ms", text="span")
+    with st.expander(f"Waterfall: {trace.name}, {waterfall['end_ms'].max():.0f} ms", expanded=True):
+        st.altair_chart(bars + labels, use_container_width=True)
+        st.dataframe(waterfall[["span", "start_ms", "duration_ms", "error", "attributes"]], hide_index=True)
+
+
+def display_collection_trend(trend):
+    points = pd.DataFrame(trend["points"])
+    line = alt.Chart(points).mark_line(point=True).encode(
+        x=alt.X("ts:T", title=None),
+        y=alt.Y("value:Q", title=trend["metric"], scale=alt.Scale(zero=False)),
+        color=alt.Color("source:N", title=None),
+        tooltip=[alt.Tooltip("ts:T", format="%Y-%m-%d %H:%M"), "source", alt.Tooltip("value:Q", format=",.2f"), "tier"],
+    )
+    if "min" in points:
+        # Hourly and daily points carry the floor's range within their bucket
+        line = alt.Chart(points.dropna(subset=["min"])).mark_area(opacity=0.2).encode(
+            x="ts:T", y="min:Q", y2="max:Q", color=alt.Color("source:N", legend=None)
+        ) + line
+    st.subheader(f"{trend['collection'].title()}: {trend['metric']} over {trend['days']} days")
+    st.altair_chart(line, use_container_width=True)
+
+
+def answer_nft_query(prompt, nft_data):
+    # Renders the answer below the current element: local projection when possible, streamed LLM answer otherwise
+    placeholder = st.empty()
+    projected = project_fields(prompt, nft_data)
+    if projected is not None:
+        placeholder.write(projected)
+        return projected
+    return stream_filter_nft_data(prompt, nft_data, placeholder)
 
 
 def get_nft_metadata_by_address(address):
@@ -90,88 +127,128 @@ def get_nft_metadata_by_address(address):
         return show_nft_data(fetch_nft_data(address)[0]["result"])
 
 
-def get_nft_metadata_by_name(nft_name):
+def get_nft_metadata_by_name(nft_name, save_alias=True):
     collection_name = nft_name.split('#')[0].strip()
-    try:
-        collection_edition = '#' + nft_name.split('#')[1].strip()
-    except:
+    edition = parse_edition(nft_name)
+    if edition is None:
         return {"Error": "Specify the edition of the NFT you are looking for, or if you are looking for a collection, specify the word 'collection' somewhere in the prompt'"}
     print(f"Collection Name: {collection_name}")
 
-    collectionId, retrievedCollectionName = get_hello_moon_collection_id(collection_name)
-    finalNFTName = retrievedCollectionName + ' ' + collection_edition
-    print(f"Final NFT Name: {finalNFTName}")
+    nft_metadata = get_nft_metadata_by_collection_key(collection_key(collection_name), edition)
+    if nft_metadata:
+        print("Found NFT metadata in MongoDB")
+        return show_nft_data(nft_metadata)
 
-    if not collection_info_exists(collectionId):
-        MAX_RETRIES = 5
-        all_metadata = []
+    collectionId, retrievedCollectionName = resolve_collection(collection_name, save_alias)
+    finalNFTName = f"{retrievedCollectionName} #{edition}"
+    print(f"Final NFT Name: {finalNFTName}")
 
+    collection_info = get_collection_info(collectionId)
+    if collection_info:
+        mongodb_collection_info_id = collection_info["_id"]
+    else:
         mongodb_collection_info_id = insert_collection_info(retrievedCollectionName, collectionId)
 
-        mint_addresses = get_mint_addresses(collectionId)
-
-        for index, chunk in enumerate(chunker(mint_addresses, 1000), 1):
-            retries = 0
-            while retries < MAX_RETRIES:
-                try:
-                    nft_data = fetch_nft_data(chunk)
-                    valid_metadata = [item for item in nft_data if
-                                      'result' in item and 'id' in item['result'] and 'content' in item['result'] and
-                                      'metadata' in item['result']['content'] and
-                                      'name' in item['result']['content']['metadata']]
-                    all_metadata.extend(valid_metadata)
-                    print(f"Successfully fetched data for chunk number {index}")
-                    break
-                except Exception as e:
-                    retries += 1
-                    print(f"Error encountered for chunk number {index}: {e}. Retrying in 10 seconds...")
-                    time.sleep(10)
-            if retries == MAX_RETRIES:
-                print(
-                    f"Failed to fetch data for chunk number {index} after {MAX_RETRIES} attempts. Saving to MongoDB...")
-                insert_failed_chunks(chunk, index, collectionId, retrievedCollectionName)
-
-        insert_nft_metadata(all_metadata, mongodb_collection_info_id)
-
-    return show_nft_data(get_nft_metadata_from_mongodb(finalNFTName))
-
-
-def get_collection_stats(collection_name):
-    collectionId, retrievedCollectionName = get_hello_moon_collection_id(collection_name)
-    return fetch_collection_stats(collectionId)
+    checkpoint = get_ingestion_checkpoint(collectionId)
+    ingestion = get_ingestion_job(collectionId)
+    if ingestion is None and needs_ingestion(collection_info, checkpoint):
+        ingestion = submit_ingestion(collectionId, retrievedCollectionName, mongodb_collection_info_id)
+
+    if ingestion is not None:
+        # The job keeps running in the background; we only wait for the chunk holding this edition
+        nft_written = ingestion.watch(edition)
+        progress_bar = st.progress(0.0, text=f"Fetching {retrievedCollectionName}...")
+        deadline = time.time() + INGESTION_WAIT_TIMEOUT
+        while not nft_written.wait(INGESTION_PROGRESS_INTERVAL):
+            if time.time() > deadline:
+                progress_bar.empty()
+                return {"Error": f"{retrievedCollectionName} is still being fetched; try {finalNFTName} again in a few minutes"}
+            progress = ingestion.progress()
+            text = f"Fetching {retrievedCollectionName}: {progress['chunks_written']}"
+            if progress["total_chunks"]:
+                text += f"/{progress['total_chunks']}"
+            progress_bar.progress(progress["fraction"], text=text + " chunks written")
+        progress_bar.empty()
+        if ingestion.remote:
+            checkpoint = get_ingestion_checkpoint(collectionId)
+
+    if checkpoint and checkpoint["status"] == "running" and (ingestion is None or ingestion.remote):
+        with st.spinner(f"{retrievedCollectionName} is being fetched by another worker..."):
+            wait_for_remote_edition(collectionId, mongodb_collection_info_id, edition, REMOTE_INGESTION_TIMEOUT)
+
+    nft_metadata = (get_nft_metadata_by_edition(mongodb_collection_info_id, edition) or
+                    get_nft_metadata_from_mongodb(finalNFTName, mongodb_collection_info_id) or
+                    find_closest_nft_metadata(finalNFTName, mongodb_collection_info_id))
+    if not nft_metadata:
+        return {"Error": f"Could not find {finalNFTName}"}
+
+    return show_nft_data(nft_metadata)
+
+
+def get_collection_stats(collection_name, save_alias=True):
+    collectionId, retrievedCollectionName = resolve_collection(collection_name, save_alias)
+    stats = fetch_collection_stats(collectionId)
+    try:
+        record_collection_stats(stats)
+    except Exception as e:
+        print(f"Failed to record stats for {retrievedCollectionName}: {e}")
+    return stats
+
+
+def find_collection_nfts_by_traits(collection_name, traits):
+    collectionId, retrievedCollectionName = resolve_collection(collection_name)
+    collection_info = get_collection_info(collectionId)
+    if not collection_info:
+        return {"Error": f"{retrievedCollectionName} has not been indexed yet; look up one of its NFTs by name first"}
+    # Collections stored before checkpoints existed have none; their index is backfilled at startup
+    checkpoint = get_ingestion_checkpoint(collectionId)
+    if checkpoint and checkpoint["status"] != "complete":
+        return {"Error": f"{retrievedCollectionName} is still being indexed; try again in a few minutes"}
+    if not has_trait_index(collection_info["_id"]):
+        return {"Error": f"The trait index for {retrievedCollectionName} is not built yet; try again in a few minutes"}
+    # Listing view only: skips the per-NFT blob and trait frequency reads show_nft_data does
+    return [{"mint_address": nft["id"], "name": nft.get("name"), "image": nft.get("image"),
+             "rarity_rank": nft.get("rarity_rank"), "traits": nft.get("traits", {})}
+            for nft in find_nfts_by_traits(collection_info["_id"], traits)]
 
 
 def show_nft_data(nft_data):
-    def safe_get(dct, keys):
-        for key in keys:
-            try:
-                dct = dct[key]
-            except (TypeError, KeyError, IndexError):
-                return None
-        return dct
-
-    attributes = safe_get(nft_data, ["content", "metadata", "attributes"]) or []
-    traits = {attr.get("trait_type"): attr.get("value") for attr in attributes}
+    # Stored documents are already compact; raw getAsset results (straight from Helius, or legacy documents the
+    # background compaction has not reached yet) are compacted here
+    if "content" in nft_data:
+        blobs = {"files": nft_data["content"].get("files"), "authorities": nft_data.get("authorities")}
+        nft_data = compact_nft_metadata(nft_data)
+    else:
+        blobs = get_nft_blobs(nft_data.get("id"))
 
     restructured_data = {
-        "mint_address": safe_get(nft_data, ["id"]),
-        "name": safe_get(nft_data, ["content", "metadata", "name"]),
-        "symbol": safe_get(nft_data, ["content", "metadata", "symbol"]),
-        "description": safe_get(nft_data, ["content", "metadata", "description"]),
-        "image": safe_get(nft_data, ["content", "links", "image"]),
-        "traits": traits,
-        "collection": safe_get(nft_data, ["grouping", 0, "group_value"]),
-        "website": safe_get(nft_data, ["content", "links", "external_url"]),
-        "files": safe_get(nft_data, ["content", "files"]),
-        "creators": safe_get(nft_data, ["creators"]),
-        "royalty": safe_get(nft_data, ["royalty"]),
-        "authorities": safe_get(nft_data, ["authorities"]),
-        "supply": safe_get(nft_data, ["supply"]),
-        "burnt": safe_get(nft_data, ["burnt"]),
-        "interface": safe_get(nft_data, ["interface"]),
-        "mutable": safe_get(nft_data, ["mutable"])
+        "mint_address": nft_data.get("id"),
+        "name": nft_data.get("name"),
+        "symbol": nft_data.get("symbol"),
+        "description": nft_data.get("description"),
+        "image": nft_data.get("image"),
+        "traits": nft_data.get("traits", {}),
+        "collection": nft_data.get("collection_address"),
+        "website": nft_data.get("website"),
+        "files": blobs.get("files"),
+        "creators": nft_data.get("creators"),
+        "royalty": nft_data.get("royalty"),
+        "authorities": blobs.get("authorities"),
+        "supply": nft_data.get("supply"),
+        "burnt": nft_data.get("burnt"),
+        "interface": nft_data.get("interface"),
+        "mutable": nft_data.get("mutable")
     }
 
+    if nft_data.get("rarity_rank"):
+        traits = restructured_data["traits"]
+        frequencies = get_trait_frequencies(nft_data["collection"], traits)
+        restructured_data["rarity"] = {
+            "rank": nft_data["rarity_rank"],
+            "score": round(nft_data["rarity_score"], 2),
+            "traits": {trait: f"{frequency:.2%}" for trait, frequency in frequencies.items()},
+        }
+
     restructured_data = {k: v for k, v in restructured_data.items() if v is not None}
 
     return restructured_data
@@ -179,283 +256,146 @@ def show_nft_data(nft_data):
 
 st.set_page_config(page_title="Vtopia SeraAI", page_icon="white-logo.png")
 
+
+def run_background_maintenance():
+    # Legacy documents are compacted first so the trait index backfill reads their traits
+    compact_legacy_nft_metadata()
+    backfill_trait_indexes()
+
+
+@st.cache_resource(show_spinner=False)
+def bootstrap_database():
+    # Runs once per server process; fails loudly if a hot-path query would scan the collection
+    ensure_indexes()
+    verify_query_plans()
+    if st.secrets.get("metrics_port"):
+        start_metrics_server(int(st.secrets.metrics_port))
+    threading.Thread(target=run_background_maintenance, daemon=True).start()
+    threading.Thread(target=run_failed_chunk_worker, daemon=True).start()
+    threading.Thread(target=run_stats_collector, daemon=True).start()
+
+
+bootstrap_database()
+
 col1, col2, col3, col4 = st.columns([2.3, 1.1, 5, 1.5])
 col2.image('white-logo.png', width=80)
 col3.title("Vtopia SeraAI")
 
 tab1, tab2 = st.tabs(["SeraAI", "Roadmap"])
 
-# Sidebar title
 st.sidebar.title("Vtopia SeraAI Features")
-
-# Introduction
-st.sidebar.markdown("Welcome to **Vtopia SeraAI**! Here's a quick guide on how to interact with the available features:")
-
-# Feature 1: Ask for NFTs in your wallet
-st.sidebar.markdown("### 1. NFTs in Your Wallet")
-st.sidebar.markdown("🔍 Query the NFTs present in your Solana wallet.")
-st.sidebar.markdown("**Example:**")
-st.sidebar.code("'Show me the NFTs in my wallet: [Your Wallet Address]'")
-
-# Feature 2: Ask about a specific NFT by its mint address
-st.sidebar.markdown("### 2. NFT Details by Mint Address")
-st.sidebar.markdown("🖼 Get detailed information of a specific NFT using its mint address.")
-st.sidebar.markdown("**Example:**")
-st.sidebar.code("'Tell me about the NFT with mint address: [Mint Address]'")
-st.sidebar.caption('You can ask it to query only specific properties of the NFT as well.')
-
-# Feature 3: Ask about an NFT by its name
-st.sidebar.markdown("### 3. NFT Details by Name")
-st.sidebar.markdown("🏷 Query details of an NFT by its name.")
-st.sidebar.markdown("**Example:**")
-st.sidebar.code("'Tell me about the NFT named: [NFT Name]'")
-st.sidebar.caption('You can ask it to query only specific properties of the NFT as well.')
-
-# Feature 4: Get stats of an NFT collection
-st.sidebar.markdown("### 4. NFT Collection Stats")
-st.sidebar.markdown("📊 Fetch statistics of a specific NFT collection.")
-st.sidebar.markdown("**Example:**")
-st.sidebar.code("'Show me the stats for the [Collection Name] collection'")
-st.sidebar.caption('You can ask it to query only specific properties of the collection as well.')
-
-
-# Feature 5: Get popular collections
-st.sidebar.markdown("### 5. Popular NFT Collections")
-st.sidebar.markdown("🌟 Discover popular NFT collections for a specified time range.")
-st.sidebar.markdown("**Example:**")
-st.sidebar.code("'Show me the popular collections for the last 7 days'")
-st.sidebar.caption('You can specify the number of top collections (1-50) and time range (1h, 1d, 7d, 30d) to fetch.')
-
-st.sidebar.markdown("---")
-st.sidebar.markdown("For more details, visit our [official website](https://vtopia.io).")
+st.sidebar.markdown(SIDEBAR_MARKDOWN, unsafe_allow_html=True)
 
 with tab1:
     query = st.text_input("Ask about NFTs in your wallet, details by mint address or name, collection stats, or discover popular collections:")
 
     if st.button('Submit'):
-        with st.spinner('Fetching NFT details...'):
-            functions = [
-                {
-                    "name": "get_nfts_by_owner",
-                    "description": "Get the SPL NFT balance of an address",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "address": {"type": "string", "description": "Solana address to fetch NFT balance for"}
-                        },
-                        "required": ["address"],
-                    },
-                },
-                {
-                    "name": "get_nft_metadata_by_address",
-                    "description": "Get metadata of a SPL NFT using its mint address",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "address": {"type": "string", "description": "Solana mint address to fetch NFT metadata for"}
-                        },
-                        "required": ["address"],
-                    },
-                },
-                {
-                    "name": "get_nft_metadata_by_name",
-                    "description": "Get metadata of an SPL NFT using its name",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "nft_name": {"type": "string", "description": "Name of the NFT to fetch metadata for"}
-                        },
-                        "required": ["nft_name"],
-                    },
-                },
-                {
-                    "name": "get_collection_stats",
-                    "description": "Get the stats of an NFT collection",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "collection_name": {"type": "string",
-                                                "description": "Name of the NFT collection to fetch stats for"}
-                        },
-                        "required": ["collection_name"],
-                    },
-                },
-                {
-                    "name": "get_popular_collections",
-                    "description": "Fetch the popular collections for a given time range and limit.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "time_range": {
-                                "type": "string",
-                                "enum": ["1h", "1d", "7d", "30d"],
-                                "description": "The time range to fetch popular collections for."
-                            },
-                            "top": {
-                                "type": "integer",
-                                "description": "The number of popular collections to fetch. Default to 10."
-                            }
-                        },
-                        "required": ["time_range", "top"]
-                    }
-                }
-            ]
-
-            response_message = ask_gpt(query, functions)
-
-            if "Error" in response_message:
-                st.write(response_message)
-
-            if response_message.get("function_call"):
-                function_name = response_message["function_call"]["name"]
-                function_args = json.loads(response_message["function_call"]["arguments"])
-
-                if function_name == "get_nfts_by_owner":
-                    nfts = get_nfts_by_owner(**function_args)
-                    for nft in nfts:
-                        display_nft_with_image(nft)
-
-                elif function_name == "get_nft_metadata_by_address":
-                    raw_result = get_nft_metadata_by_address(**function_args)
-                    solscan_url = f"https://solscan.io/token/{raw_result['mint_address']}"
-                    cols = st.columns([1, 1])
-                    image_html = f"""
-                    <a href="{solscan_url}" target="_blank">
-                        <img src="{raw_result['image']}" style="border-radius: 15px; width: 350px;">
-                    </a>
-                    """
-                    cols[0].markdown(image_html, unsafe_allow_html=True)
-                    name_html = f"<center><h3>{raw_result['name']}</h3></center>"
-                    cols[0].markdown(name_html, unsafe_allow_html=True)
-                    filtered_result = filter_nft_data(query, raw_result)
-                    st.write(filtered_result)
-
-                elif function_name == "get_nft_metadata_by_name":
-                    raw_result = get_nft_metadata_by_name(**function_args)
-                    if "Error" in raw_result:
-                        st.write(raw_result)
-                        st.stop()
-                    solscan_url = f"https://solscan.io/token/{raw_result['mint_address']}"
-                    cols = st.columns([1, 1])
-                    image_html = f"""
-                    <a href="{solscan_url}" target="_blank">
-                        <img src="{raw_result['image']}" style="border-radius: 15px; width: 350px;">
-                    </a>
-                    """
-                    cols[0].markdown(image_html, unsafe_allow_html=True)
-                    name_html = f"<center><h3>{raw_result['name']}</h3></center>"
-                    cols[0].markdown(name_html, unsafe_allow_html=True)
-                    filtered_result = filter_nft_data(query, raw_result)
-                    st.write(filtered_result)
-
-                elif function_name == "get_collection_stats":
-                    raw_result = get_collection_stats(**function_args)
-                    cols = st.columns([1, 1])
-                    image_html = f"""
-                    <a href="{raw_result["website"]}" target="_blank">
-                        <img src="{raw_result['image']}" style="border-radius: 15px; width: 350px;">
-                    </a>
-                    """
-                    cols[0].markdown(image_html, unsafe_allow_html=True)
-                    name_html = f"<center><h3>{raw_result['collectionName']}</h3></center>"
-                    cols[0].markdown(name_html, unsafe_allow_html=True)
-                    filtered_result = filter_nft_data(query, raw_result)
-                    st.write(filtered_result)
-
-                elif function_name == "get_popular_collections":
-                    popular_collections = get_popular_collections(**function_args)
-                    for collection in popular_collections:
-                        display_nft_with_image(collection)
-
-features = [
-    # Existing Features
-    {
-        "title": "🔍 View Your NFTs",
-        "description": "Simply input your Solana wallet address and see all the NFTs you own.",
-        "stage": "Launched",
-    },
-    {
-        "title": "🔖 Details by Mint Address",
-        "description": "Want to know more about an NFT? Just provide its mint address. You can also ask specific questions or request particular details.",
-        "stage": "Launched",
-    },
-    {
-        "title": "📛 Details by NFT Name",
-        "description": "Search for an NFT using its name. Ask specific questions or request only the details you're interested in.",
-        "stage": "Launched",
-    },
-    {
-        "title": "📊 Collection Stats",
-        "description": "Get insights on any NFT collection. Ask about specific stats or pose a question about the collection.",
-        "stage": "Launched",
-    },
-    {
-        "title": "🌟 Popular Collections",
-        "description": "Discover the trending NFT collections. Choose from time ranges of 1 hour, 1 day, 7 days, or 30 days, and select your desired number of top collections (from 1 to 50).",
-        "stage": "Launched",
-    },
-    # Upcoming Features
-    {
-        "title": "📝 List NFT on Vtopia",
-        "description": "List NFT by its name on Vtopia",
-        "stage": "Development",
-    },
-    {
-        "title": "🛍️ Buy NFT from Vtopia",
-        "description": "You can buy NFT just by its name",
-        "stage": "Development",
-    },
-    {
-        "title": "🔥 Bulk Actions",
-        "description": "Buy/List Multiple NFT from Vtopia in single prompt",
-        "stage": "Development",
-    },
-    {
-        "title": "💼 Make collection offer",
-        "description": "You can make collection offers with global traits on Vtopia by collection name",
-        "stage": "Development",
-    },
-    {
-        "title": "🤝 Make/Accept Offer",
-        "description": "Make or accept offers for NFTs on Vtopia",
-        "stage": "Development",
-    }
-]
-
-STAGE_COLORS = {
-    "Launched": "rgba(76, 175, 80, 0.5)",  # Greenish
-    "Development": "rgba(255, 193, 7, 0.5)"  # Yellowish
-}
-
-
-def _get_stage_tag(stage):
-    color = STAGE_COLORS.get(stage, "rgba(206, 205, 202, 0.5)")
-    return (
-        f'<span style="background-color: {color}; padding: 1px 6px; '
-        "margin: 0 5px; display: inline; vertical-align: middle; "
-        f"border-radius: 0.25rem; font-size: 0.75rem; font-weight: 400; "
-        f'white-space: nowrap">{stage}'
-        "</span>"
-    )
-
+        st.session_state.pop("wallet_view", None)
+        with st.spinner('Fetching NFT details...'), start_trace("submit") as trace:
+            st.session_state["last_trace"] = trace
+            route = route_query(query)
+            if route:
+                function_name, function_args = route
+            else:
+                function_name, function_args = None, {}
+                started = time.perf_counter()
+                response_message = ask_gpt(query, ROUTING_FUNCTIONS)
+                record_llm_routing(time.perf_counter() - started)
+
+                if "Error" in response_message:
+                    st.write(response_message)
+
+                if response_message.get("function_call"):
+                    function_name = response_message["function_call"]["name"]
+                    function_args = json.loads(response_message["function_call"]["arguments"])
+
+            if function_name:
+                with span(f"handler.{function_name}", routed_locally=route is not None):
+                    if function_name == "get_nfts_by_owner":
+                        st.session_state["wallet_view"] = {"address": function_args["address"], "page": 1}
+
+                    elif function_name == "get_nft_metadata_by_address":
+                        raw_result = get_nft_metadata_by_address(**function_args)
+                        solscan_url = f"https://solscan.io/token/{raw_result['mint_address']}"
+                        cols = st.columns([1, 1])
+                        image_html = f"""
+                        <a href="{solscan_url}" target="_blank">
+                            <img src="{thumbnail_url(raw_result['image'], 'detail')}" style="border-radius: 15px; width: 350px;">
+                        </a>
+                        """
+                        cols[0].markdown(image_html, unsafe_allow_html=True)
+                        name_html = f"<center><h3>{raw_result['name']}</h3></center>"
+                        cols[0].markdown(name_html, unsafe_allow_html=True)
+                        answer_nft_query(query, raw_result)
+
+                    elif function_name == "get_nft_metadata_by_name":
+                        raw_result = get_nft_metadata_by_name(**function_args, save_alias=route is None)
+                        if "Error" in raw_result:
+                            st.write(raw_result)
+                            st.stop()
+                        solscan_url = f"https://solscan.io/token/{raw_result['mint_address']}"
+                        cols = st.columns([1, 1])
+                        image_html = f"""
+                        <a href="{solscan_url}" target="_blank">
+                            <img src="{thumbnail_url(raw_result['image'], 'detail')}" style="border-radius: 15px; width: 350px;">
+                        </a>
+                        """
+                        cols[0].markdown(image_html, unsafe_allow_html=True)
+                        name_html = f"<center><h3>{raw_result['name']}</h3></center>"
+                        cols[0].markdown(name_html, unsafe_allow_html=True)
+                        answer_nft_query(query, raw_result)
+
+                    elif function_name == "get_collection_stats":
+                        raw_result = get_collection_stats(**function_args, save_alias=route is None)
+                        cols = st.columns([1, 1])
+                        image_html = f"""
+                        <a href="{raw_result["website"]}" target="_blank">
+                            <img src="{thumbnail_url(raw_result['image'], 'detail')}" style="border-radius: 15px; width: 350px;">
+                        </a>
+                        """
+                        cols[0].markdown(image_html, unsafe_allow_html=True)
+                        name_html = f"<center><h3>{raw_result['collectionName']}</h3></center>"
+                        cols[0].markdown(name_html, unsafe_allow_html=True)
+                        answer_nft_query(query, raw_result)
+
+                    elif function_name == "get_popular_collections":
+                        popular_collections = get_popular_collections(**function_args)
+                        for collection in popular_collections:
+                            display_nft_with_image(collection)
+
+                    elif function_name == "find_nfts_by_traits":
+                        matches = find_collection_nfts_by_traits(**function_args)
+                        if "Error" in matches:
+                            st.write(matches)
+                            st.stop()
+                        st.caption(f"{len(matches)} NFTs match {function_args['traits']}, rarest first")
+                        for nft in matches:
+                            display_nft_with_image(nft)
+
+                    elif function_name == "get_collection_trend":
+                        trend = get_collection_trend(**function_args, save_alias=route is None)
+                        if "Error" in trend:
+                            st.write(trend)
+                            st.stop()
+                        display_collection_trend(trend)
+
+    if "wallet_view" in st.session_state:
+        with st.spinner('Fetching NFTs...'), start_trace("wallet_view") as trace:
+            st.session_state["last_trace"] = trace
+            with span("render.wallet_view", page=st.session_state["wallet_view"]["page"]):
+                display_wallet_view()
+
+    routing = router_stats()
+    if routing["queries"]:
+        st.sidebar.caption(f"Local routing: {routing['hit_rate']:.0%} of {routing['queries']} queries skipped the LLM "
+                           f"(~{routing['saved_seconds']:.1f}s saved)")
+    llm_cache = llm_cache_stats()
+    if llm_cache["hits"] + llm_cache["misses"]:
+        st.sidebar.caption(f"LLM cache: {llm_cache['hits']} hits, {llm_cache['misses']} misses "
+                           f"({llm_cache['hit_rate']:.0%}, ~{llm_cache['saved_seconds']:.1f}s saved)")
+
+    if "last_trace" in st.session_state and st.sidebar.checkbox("Show query waterfall"):
+        display_trace_waterfall(st.session_state["last_trace"])
 
 with tab2:
-    # Launched Features
-    st.markdown("## 🚀 September 2023")
-    st.markdown("<br>", unsafe_allow_html=True)  # Adding blank space
-    for feature in features:
-        if feature["stage"] == "Launched":
-            stage_tag = _get_stage_tag(feature["stage"])
-            st.markdown(f"#### {feature['title']} {stage_tag}", unsafe_allow_html=True)
-            st.markdown(f"<div style='padding-left: 38px; margin-bottom: 15px;'><span style='color: gray;'>{feature['description']}</span></div>", unsafe_allow_html=True)
-
-    st.markdown("---", unsafe_allow_html=True)
-
-    # Development Features
-    st.markdown("## 🛠️ October 2023")
-    st.markdown("<br>", unsafe_allow_html=True)  # Adding blank space
-    for feature in features:
-        if feature["stage"] != "Launched":
-            stage_tag = _get_stage_tag(feature["stage"])
-            st.markdown(f"#### {feature['title']} {stage_tag}", unsafe_allow_html=True)
-            st.markdown(f"<div style='padding-left: 38px; margin-bottom: 15px;'><span style='color: gray;'>{feature['description']}</span></div>", unsafe_allow_html=True)
+    st.markdown(ROADMAP_MARKDOWN, unsafe_allow_html=True)
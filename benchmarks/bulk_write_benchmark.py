@@ -0,0 +1,82 @@
+"""Throughput of the NFT metadata write path: the old fixed-size InsertOne batches against byte-sized upserts.
+
+Importing mongodb_functions opens no connection and reads no secrets (its client is built on first use), and
+upsert_documents writes to whichever collection it is given, so the benchmark only touches the scratch database on
+--uri, which is dropped afterwards. No .streamlit/secrets.toml is needed:
+
+    python benchmarks/bulk_write_benchmark.py --uri mongodb://localhost:27017 --docs 20000
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import MongoClient, InsertOne, ASCENDING
+from pymongo.errors import BulkWriteError
+from mongodb_functions import DUPLICATE_KEY_ERROR, nft_metadata_document, upsert_documents
+
+BENCHMARK_DB = "Vtopia_benchmark"
+
+
+def make_documents(count: int, description_bytes: int) -> list:
+    # Compact documents as insert_nft_metadata stores them; the description pads them to a realistic size
+    padding = "".join(random.choices(string.ascii_letters, k=description_bytes))
+    return [nft_metadata_document({
+        "id": f"Mint{i:040d}",
+        "interface": "V1_NFT",
+        "content": {"metadata": {"name": f"Benchmark #{i}", "description": padding,
+                                 "attributes": [{"trait_type": f"trait{t}", "value": f"value{i % 17}"} for t in range(8)]}},
+    }, "benchmark") for i in range(count)]
+
+
+def insert_one_batches(collection, documents: list):
+    # The previous insert_nft_metadata write path
+    for i in range(0, len(documents), 7000):
+        try:
+            collection.bulk_write([InsertOne(dict(doc)) for doc in documents[i:i + 7000]], ordered=False)
+        except BulkWriteError as e:
+            if any(error["code"] != DUPLICATE_KEY_ERROR for error in e.details["writeErrors"]):
+                raise
+
+
+def timed(label: str, collection, write, documents: list):
+    started = time.perf_counter()
+    write(collection, documents)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<32} {elapsed:8.2f}s {len(documents) / elapsed:10.0f} docs/s {collection.count_documents({}):>8} stored")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uri", default=os.environ.get("BENCHMARK_MONGODB_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--doc-bytes", type=int, default=2000, help="Padding added to each document")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    client = MongoClient(args.uri)
+    db = client[BENCHMARK_DB]
+    documents = make_documents(args.docs, args.doc_bytes)
+
+    paths = [
+        ("insert_one 7000-doc batches", insert_one_batches),
+        ("upsert, sequential", upsert_documents),
+        (f"upsert, {args.concurrency} writers", lambda c, d: upsert_documents(c, d, args.concurrency)),
+    ]
+    try:
+        for index, (label, write) in enumerate(paths):
+            collection = db[f"nft_metadata_{index}"]
+            collection.drop()
+            collection.create_index([("id", ASCENDING)], unique=True)
+            timed(f"{label} (fresh)", collection, write, documents)
+            timed(f"{label} (re-ingest)", collection, write, documents)
+    finally:
+        client.drop_database(BENCHMARK_DB)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""End-to-end latency per intent and ingestion throughput, with every upstream replaced by a local stand-in.
+
+Helius, HelloMoon, Magic Eden, OpenAI and image hosts are served by benchmarks/upstream_mocks.py. MongoDB is a
+throwaway mongod started on a temporary dbpath (mongod must be on PATH), or a disposable server passed with
+--mongodb-uri; the app writes to its Vtopia database there, so never point this at a real deployment.
+
+The app runs through streamlit.testing (Streamlit >= 1.28) from a temporary working directory whose
+.streamlit/secrets.toml points every client at the stand-ins:
+
+    python benchmarks/end_to_end_benchmark.py --runs 20 --latency helius=0.08 --latency openai=0.6
+    python benchmarks/end_to_end_benchmark.py --sizes 1000,10000,50000 --error-rate hellomoon=0.02
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from upstream_mocks import UpstreamMocks, collection_id
+
+QUERY_COLLECTION = "Mock Apes"
+QUERY_COLLECTION_SUPPLY = 2000
+INTENTS = {
+    "nft_by_name": lambda mocks, rng: f"Tell me about {QUERY_COLLECTION} #{rng.randint(1, QUERY_COLLECTION_SUPPLY)}",
+    "nft_by_address": lambda mocks, rng: "Tell me about the NFT with mint address "
+                                         + mocks.mint_address(QUERY_COLLECTION, rng.randint(1, QUERY_COLLECTION_SUPPLY)),
+    "nft_question_llm": lambda mocks, rng: f"Are the eyes violet for {QUERY_COLLECTION} "
+                                           f"#{rng.randint(1, QUERY_COLLECTION_SUPPLY)}?",
+    "wallet": lambda mocks, rng: f"Show me the NFTs in my wallet: {mocks.wallet_address(rng.randint(1, 10 ** 6))}",
+    "collection_stats": lambda mocks, rng: f"stats for {QUERY_COLLECTION}",
+    "popular_collections": lambda mocks, rng: f"top {rng.randint(3, 20)} popular collections this week",
+    # Phrasings the local router leaves alone, so these pay for an ask_gpt routing call (unique, so never cached)
+    "stats_llm_routed": lambda mocks, rng: f"How has {QUERY_COLLECTION} been trading in the last "
+                                           f"{rng.randint(2, 10 ** 6)} minutes?",
+    "wallet_llm_routed": lambda mocks, rng: f"Which NFTs does {mocks.wallet_address(rng.randint(1, 10 ** 6))} have?",
+}
+
+
+def provider_values(pairs: list, cast=float) -> dict:
+    return {provider: cast(value) for provider, value in (pair.split("=", 1) for pair in pairs or [])}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mongod(dbpath: str):
+    if shutil.which("mongod") is None:
+        sys.exit("mongod is not on PATH; install it or pass --mongodb-uri for a disposable server")
+    port = free_port()
+    process = subprocess.Popen(["mongod", "--dbpath", dbpath, "--port", str(port), "--bind_ip", "127.0.0.1"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process, f"mongodb://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    sys.exit("mongod did not start within 30s")
+
+
+def write_workdir(workdir: str, secrets: dict):
+    # st.secrets reads .streamlit/secrets.toml from the working directory, and app.py loads its logo relative to it
+    os.makedirs(os.path.join(workdir, ".streamlit"))
+    with open(os.path.join(workdir, ".streamlit", "secrets.toml"), "w") as secrets_file:
+        for key, value in secrets.items():
+            secrets_file.write(f"{key} = {json.dumps(value)}\n")
+    shutil.copy(os.path.join(REPO_DIR, ".streamlit", "config.toml"), os.path.join(workdir, ".streamlit"))
+    shutil.copy(os.path.join(REPO_DIR, "white-logo.png"), workdir)
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_query(query: str, timeout: float) -> float:
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.join(REPO_DIR, "app.py"), default_timeout=timeout)
+    app.run()
+    app.text_input[0].input(query)
+    submit = next(button for button in app.button if button.label == "Submit")
+    started = time.perf_counter()
+    submit.click().run()
+    elapsed = time.perf_counter() - started
+    if app.exception:
+        raise RuntimeError(f"{query!r} failed: {app.exception[0].message}")
+    return elapsed
+
+
+def benchmark_intents(mocks: UpstreamMocks, runs: int, timeout: float, seed: int):
+    rng = random.Random(seed)
+    # The first lookup ingests the query collection; it is reported as ingestion, not as query latency
+    from ingestion_functions import get_ingestion_job
+    run_query(INTENTS["nft_by_name"](mocks, rng), timeout)
+    job = get_ingestion_job(collection_id(QUERY_COLLECTION))
+    if job is not None:
+        job.done.wait()
+
+    print(f"\n{'intent':<22}{'runs':>6}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for intent, make_query in INTENTS.items():
+        latencies = [run_query(make_query(mocks, rng), timeout) * 1000 for _ in range(runs)]
+        print(f"{intent:<22}{runs:>6}{statistics.median(latencies):>10.0f}{percentile(latencies, 0.95):>10.0f}"
+              f"{max(latencies):>10.0f}")
+
+    # The mock resolves any name to its closest collection, so a misread name still "succeeds" above;
+    # anything other than a real collection name reaching the name search is a routing regression
+    known = {name.lower() for name in mocks.collections}
+    misread = sorted({name for name in mocks.name_searches if name.lower() not in known})
+    if misread:
+        raise RuntimeError(f"Collection names misread by the router: {misread}")
+
+
+def benchmark_ingestion(mocks: UpstreamMocks, sizes: list):
+    from ingestion_functions import CollectionIngestion
+    from mongodb_functions import insert_collection_info, nft_metadata_collection
+
+    print(f"\n{'mints':>8}{'seconds':>10}{'mints/s':>10}{'stored':>10}{'status':>12}")
+    for size in sizes:
+        name = f"Mock Ingest {size}"
+        mocks.add_collection(name, size)
+        collection_info_id = insert_collection_info(name, collection_id(name))
+        ingestion = CollectionIngestion(collection_id(name), name, collection_info_id)
+        started = time.perf_counter()
+        ingestion.run()
+        elapsed = time.perf_counter() - started
+        stored = nft_metadata_collection.count_documents({"collection": collection_info_id})
+        print(f"{size:>8}{elapsed:>10.1f}{stored / elapsed:>10.0f}{stored:>10}{ingestion.status:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongodb-uri", help="Disposable MongoDB server; defaults to a throwaway local mongod")
+    parser.add_argument("--runs", type=int, default=20, help="Queries per intent")
+    parser.add_argument("--sizes", default="1000,5000,10000,50000", help="Synthetic collection sizes to ingest")
+    parser.add_argument("--latency", action="append", metavar="PROVIDER=SECONDS",
+                        help="Added latency per upstream: helius, hellomoon, magiceden, openai, images")
+    parser.add_argument("--error-rate", action="append", metavar="PROVIDER=FRACTION",
+                        help="Fraction of upstream requests answered with a 503")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds a single app run may take")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-intents", action="store_true")
+    parser.add_argument("--skip-ingestion", action="store_true")
+    args = parser.parse_args()
+
+    mocks = UpstreamMocks({QUERY_COLLECTION: QUERY_COLLECTION_SUPPLY}, provider_values(args.latency),
+                          provider_values(args.error_rate), seed=args.seed).start()
+    workdir = tempfile.mkdtemp(prefix="vtopia-benchmark-")
+    mongod = None
+    try:
+        mongodb_uri = args.mongodb_uri
+        if mongodb_uri is None:
+            os.makedirs(os.path.join(workdir, "db"))
+            mongod, mongodb_uri = start_mongod(os.path.join(workdir, "db"))
+
+        write_workdir(workdir, {"MONGODB_URI": mongodb_uri, "helius_api_key": "benchmark",
+                                "hellomoon_api_key": "benchmark", "openai_api_key": "benchmark",
+                                "snapshot_dir": os.path.join(workdir, "snapshots"), "image_host_allowlist": ["127.0.0.1"],
+                                **mocks.base_urls()})
+        os.chdir(workdir)
+
+        if not args.skip_intents:
+            benchmark_intents(mocks, args.runs, args.timeout, args.seed)
+        if not args.skip_ingestion:
+            benchmark_ingestion(mocks, [int(size) for size in args.sizes.split(",")])
+        print(f"\nUpstream requests: {mocks.requests}")
+    finally:
+        mocks.stop()
+        if mongod is not None:
+            mongod.terminate()
+            mongod.wait()
+        os.chdir(REPO_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Cold start and per-rerun cost of the app, checked against a budget.
+
+Import time is measured in fresh interpreters importing the backend modules the way app.py does. First-run and
+rerun time come from streamlit.testing (Streamlit >= 1.28) against the same stand-ins the end-to-end benchmark uses,
+since the first run bootstraps indexes. Exits non-zero when any measurement is over its budget:
+
+    python benchmarks/startup_benchmark.py --reruns 50
+    python benchmarks/startup_benchmark.py --import-budget 2.5 --rerun-budget-ms 150
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from end_to_end_benchmark import QUERY_COLLECTION, QUERY_COLLECTION_SUPPLY, percentile, start_mongod, write_workdir
+from upstream_mocks import UpstreamMocks
+
+BACKEND_MODULES = ["mongodb_functions", "hellomoon_functions", "helius_functions", "magiceden_functions",
+                   "ingestion_functions", "resolver_functions", "router_functions", "projection_functions",
+                   "openai_functions", "wallet_functions", "image_functions", "tracing_functions", "page_content",
+                   "stats_functions"]
+IMPORT_SCRIPT = ("import time; started = time.perf_counter(); import streamlit; streamlit_done = time.perf_counter(); "
+                 "import {modules}; done = time.perf_counter(); "
+                 "print(streamlit_done - started, done - streamlit_done)")
+
+
+def measure_imports(samples: int) -> tuple:
+    # Fresh interpreters, so nothing is served from sys.modules; streamlit itself is reported separately
+    streamlit_times, backend_times = [], []
+    script = IMPORT_SCRIPT.format(modules=", ".join(BACKEND_MODULES))
+    for _ in range(samples):
+        output = subprocess.run([sys.executable, "-c", script], cwd=REPO_DIR, capture_output=True, text=True,
+                                check=True).stdout
+        streamlit_seconds, backend_seconds = map(float, output.split())
+        streamlit_times.append(streamlit_seconds)
+        backend_times.append(backend_seconds)
+    return statistics.median(streamlit_times), statistics.median(backend_times)
+
+
+def measure_reruns(reruns: int, timeout: float) -> tuple:
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.join(REPO_DIR, "app.py"), default_timeout=timeout)
+    started = time.perf_counter()
+    app.run()
+    first_run = time.perf_counter() - started
+    if app.exception:
+        raise RuntimeError(f"First run failed: {app.exception[0].message}")
+
+    rerun_times = []
+    for _ in range(reruns):
+        started = time.perf_counter()
+        app.run()
+        rerun_times.append((time.perf_counter() - started) * 1000)
+    return first_run, rerun_times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongodb-uri", help="Disposable MongoDB server; defaults to a throwaway local mongod")
+    parser.add_argument("--import-samples", type=int, default=5)
+    parser.add_argument("--reruns", type=int, default=30)
+    parser.add_argument("--import-budget", type=float, default=1.0, help="Seconds for the backend modules")
+    parser.add_argument("--first-run-budget", type=float, default=5.0, help="Seconds for the first script run")
+    parser.add_argument("--rerun-budget-ms", type=float, default=200, help="p95 milliseconds per rerun")
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    streamlit_seconds, backend_seconds = measure_imports(args.import_samples)
+
+    mocks = UpstreamMocks({QUERY_COLLECTION: QUERY_COLLECTION_SUPPLY}).start()
+    workdir = tempfile.mkdtemp(prefix="vtopia-startup-")
+    mongod = None
+    try:
+        mongodb_uri = args.mongodb_uri
+        if mongodb_uri is None:
+            os.makedirs(os.path.join(workdir, "db"))
+            mongod, mongodb_uri = start_mongod(os.path.join(workdir, "db"))
+        write_workdir(workdir, {"MONGODB_URI": mongodb_uri, "helius_api_key": "benchmark",
+                                "hellomoon_api_key": "benchmark", "openai_api_key": "benchmark",
+                                "snapshot_dir": os.path.join(workdir, "snapshots"), "image_host_allowlist": ["127.0.0.1"],
+                                **mocks.base_urls()})
+        os.chdir(workdir)
+        first_run, rerun_times = measure_reruns(args.reruns, args.timeout)
+    finally:
+        mocks.stop()
+        if mongod is not None:
+            mongod.terminate()
+            mongod.wait()
+        os.chdir(REPO_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    rerun_p95 = percentile(rerun_times, 0.95)
+    results = [
+        ("import streamlit", streamlit_seconds * 1000, None),
+        ("import backend modules", backend_seconds * 1000, args.import_budget * 1000),
+        ("first run", first_run * 1000, args.first_run_budget * 1000),
+        ("rerun p50", statistics.median(rerun_times), None),
+        ("rerun p95", rerun_p95, args.rerun_budget_ms),
+    ]
+    over_budget = False
+    print(f"\n{'measurement':<26}{'ms':>10}{'budget ms':>12}")
+    for label, value, budget in results:
+        flag = ""
+        if budget is not None and value > budget:
+            flag = "  OVER BUDGET"
+            over_budget = True
+        print(f"{label:<26}{value:>10.1f}{budget if budget is not None else '':>12}{flag}")
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
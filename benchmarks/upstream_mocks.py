@@ -0,0 +1,279 @@
+"""Local stand-ins for Helius, HelloMoon, Magic Eden, OpenAI and NFT image hosts.
+
+Every upstream is served from one threaded HTTP server under its own path prefix (/helius, /hellomoon, /magiceden,
+/openai, /images) so each can be given its own latency and error rate. Responses follow the shape of recorded
+upstream responses and are generated deterministically from the synthetic collections passed in.
+"""
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image
+
+PROVIDERS = ("helius", "hellomoon", "magiceden", "openai", "images")
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+BASE58_ADDRESS = re.compile(r"\b[1-9A-HJ-NP-Za-km-z]{32,44}\b")
+EDITION = re.compile(r"#\s*(\d+)")
+TRAIT_VALUES = {
+    "Background": ["Blue", "Red", "Green", "Gold", "Purple"],
+    "Eyes": ["Violet", "Laser", "Sleepy", "Wide", "Closed", "Angry"],
+    "Fur": ["Brown", "Black", "White", "Zombie"],
+    "Hat": ["None", "Cap", "Crown", "Beanie", "Halo", "Helmet", "Bandana"],
+}
+
+
+def base58_address(seed: str) -> str:
+    number = int.from_bytes(hashlib.sha256(seed.encode()).digest(), "big")
+    address = ""
+    while number:
+        number, remainder = divmod(number, 58)
+        address = BASE58_ALPHABET[remainder] + address
+    return address
+
+
+def edit_distance(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def collection_id(name: str) -> str:
+    return hashlib.sha256(name.encode()).hexdigest()[:32]
+
+
+class UpstreamMocks:
+    def __init__(self, collections: dict, latency: dict = None, error_rate: dict = None, wallet_size: int = 60,
+                 seed: int = 0):
+        # collections maps collection name -> supply; latency and error_rate map provider -> seconds / probability
+        self.collections = {}
+        self.mints = {}
+        for name, supply in collections.items():
+            self.add_collection(name, supply)
+        self.latency = {provider: 0.0 for provider in PROVIDERS}
+        self.latency.update(latency or {})
+        self.error_rate = {provider: 0.0 for provider in PROVIDERS}
+        self.error_rate.update(error_rate or {})
+        self.wallet_size = wallet_size
+        self.random = random.Random(seed)
+        self.requests = {provider: 0 for provider in PROVIDERS}
+        # Every collectionName sent to the HelloMoon name search, so callers can spot names the router misread
+        self.name_searches = []
+        self._lock = threading.Lock()
+        self._image = self._render_image()
+        self.server = None
+
+    def add_collection(self, name: str, supply: int):
+        self.collections[name] = {"id": collection_id(name), "supply": supply}
+        for edition in range(1, supply + 1):
+            self.mints[base58_address(f"{name}:{edition}")] = (name, edition)
+
+    def mint_address(self, name: str, edition: int) -> str:
+        return base58_address(f"{name}:{edition}")
+
+    def wallet_address(self, index: int) -> str:
+        return base58_address(f"wallet:{index}")
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def base_urls(self) -> dict:
+        # Secrets overrides pointing the app at this server
+        return {
+            "helius_base_url": f"{self.url}/helius",
+            "hellomoon_base_url": f"{self.url}/hellomoon",
+            "magiceden_base_url": f"{self.url}/magiceden",
+            "openai_api_base": f"{self.url}/openai/v1",
+        }
+
+    def start(self):
+        mocks = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                mocks.handle(self, None)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                mocks.handle(self, json.loads(self.rfile.read(length) or b"null"))
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, handler, body):
+        path, _, query = handler.path.partition("?")
+        provider = path.split("/")[1]
+        if provider not in PROVIDERS:
+            return self.reply(handler, 404, {"error": "unknown upstream"})
+
+        with self._lock:
+            self.requests[provider] += 1
+            failed = self.random.random() < self.error_rate[provider]
+        time.sleep(self.latency[provider])
+        if failed:
+            return self.reply(handler, 503, {"error": "injected failure"})
+
+        route = path[len(provider) + 1:]
+        if provider == "helius":
+            return self.reply(handler, 200, self.helius(body))
+        if provider == "hellomoon":
+            return self.reply(handler, 200, self.hellomoon(route, body))
+        if provider == "magiceden":
+            return self.reply(handler, 200, self.popular_collections())
+        if provider == "openai":
+            return self.openai(handler, body)
+        return self.reply(handler, 200, self._image, "image/png")
+
+    def reply(self, handler, status: int, payload, content_type: str = "application/json"):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def asset(self, mint: str) -> dict:
+        name, edition = self.mints[mint]
+        rng = random.Random(mint)
+        return {
+            "interface": "V1_NFT",
+            "id": mint,
+            "content": {
+                "$schema": "https://schema.metaplex.com/nft1.0.json",
+                "json_uri": f"{self.url}/images/{edition}.json",
+                "files": [{"uri": f"{self.url}/images/{edition}.png", "mime": "image/png"}],
+                "metadata": {
+                    "attributes": [{"trait_type": trait, "value": rng.choice(values)}
+                                   for trait, values in TRAIT_VALUES.items()],
+                    "description": f"{name} is a synthetic benchmark collection.",
+                    "name": f"{name} #{edition}",
+                    "symbol": name[:4].upper(),
+                },
+                "links": {"image": f"{self.url}/images/{edition}.png", "external_url": "https://example.com"},
+            },
+            "authorities": [{"address": base58_address(f"authority:{name}"), "scopes": ["full"]}],
+            "grouping": [{"group_key": "collection", "group_value": base58_address(f"collection:{name}")}],
+            "royalty": {"royalty_model": "creators", "percent": 0.05, "basis_points": 500},
+            "creators": [{"address": base58_address(f"creator:{name}"), "share": 100, "verified": True}],
+            "supply": {"print_max_supply": 0, "print_current_supply": 0},
+            "burnt": False,
+            "mutable": True,
+        }
+
+    def helius(self, body):
+        if isinstance(body, list):
+            return [{"jsonrpc": "2.0", "id": call["id"], "result": self.asset(call["params"]["id"])}
+                    for call in body if call["params"]["id"] in self.mints]
+
+        params = body["params"]
+        if body["method"] == "getAssetsByOwner":
+            # Wallets hold the first wallet_size mints of the first collection, paged like Helius
+            mints = list(self.mints)[:self.wallet_size]
+            start = (params["page"] - 1) * params["limit"]
+            items = [self.asset(mint) for mint in mints[start:start + params["limit"]]]
+            return {"jsonrpc": "2.0", "id": body["id"], "result": {"total": len(items), "items": items}}
+        return {"jsonrpc": "2.0", "id": body["id"], "result": self.asset(params["id"])}
+
+    def hellomoon(self, route: str, body: dict):
+        if route == "/v0/nft/collection/name":
+            # Like HelloMoon's levenshtein strategy: the closest name wins, however unrelated it is
+            with self._lock:
+                self.name_searches.append(body["collectionName"])
+            wanted = body["collectionName"].lower()
+            matches = sorted(self.collections, key=lambda name: edit_distance(wanted, name.lower()))
+            return {"data": [{"collectionName": name, "helloMoonCollectionId": self.collections[name]["id"]}
+                             for name in matches[:1]]}
+
+        name = next(name for name, info in self.collections.items()
+                    if info["id"] == body["helloMoonCollectionId"])
+        supply = self.collections[name]["supply"]
+        if route == "/v0/nft/collection/mints":
+            start = (body["page"] - 1) * body["limit"]
+            editions = range(start + 1, min(start + body["limit"], supply) + 1)
+            return {"data": [{"nftMint": self.mint_address(name, edition)} for edition in editions]}
+
+        return {"data": [{
+            "collectionName": name, "helloMoonCollectionId": self.collections[name]["id"],
+            "narrative": f"{name} is a synthetic benchmark collection.",
+            "sample_image": f"{self.url}/images/1.png", "external_url": "https://example.com",
+            "slug": name.lower().replace(" ", "_"), "supply": supply, "listing_count": supply // 20,
+            "floorPrice": 1_500_000_000, "current_owner_count": supply // 2,
+            "granularity": granularity, "volume": 42_000_000_000, "price_percent_change": 1.5,
+            "volume_percent_change": -3.2,
+        } for granularity in ("THIRTY_MIN", "ONE_HOUR", "SIX_HOUR", "HALF_DAY", "ONE_DAY", "ONE_WEEK", "ONE_MONTH")]}
+
+    def popular_collections(self) -> list:
+        return [{"symbol": name.lower().replace(" ", "_"), "name": name, "description": "",
+                 "image": f"{self.url}/images/{rank}.png", "floorPrice": 1_000_000_000 * (rank + 1)}
+                for rank, name in enumerate(self.collections)] * 10
+
+    def openai(self, handler, body: dict):
+        created = int(time.time())
+        if body.get("functions"):
+            message = self.route(body["messages"][-1]["content"])
+            finish_reason = "function_call" if "function_call" in message else "stop"
+            return self.reply(handler, 200, {"id": "chatcmpl-mock", "object": "chat.completion", "created": created,
+                                             "model": body["model"],
+                                             "choices": [{"index": 0, "message": message,
+                                                          "finish_reason": finish_reason}]})
+
+        answer = "Yes, going by the traits in the data provided, that is the case for this NFT."
+        if not body.get("stream"):
+            message = {"role": "assistant", "content": answer}
+            return self.reply(handler, 200, {"id": "chatcmpl-mock", "object": "chat.completion", "created": created,
+                                             "model": body["model"],
+                                             "choices": [{"index": 0, "message": message, "finish_reason": "stop"}]})
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+        for token in answer.split(" "):
+            chunk = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created,
+                     "model": body["model"], "choices": [{"index": 0, "delta": {"content": token + " "}}]}
+            handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            handler.wfile.flush()
+        handler.wfile.write(b"data: [DONE]\n\n")
+        handler.close_connection = True
+
+    def route(self, query: str) -> dict:
+        # Stands in for the routing model's function choice, with the arguments it would extract
+        collection = next((name for name in self.collections if name.lower() in query.lower()), None)
+        address = BASE58_ADDRESS.search(query)
+        edition = EDITION.search(query)
+        if address:
+            call = ("get_nfts_by_owner", {"address": address.group(0)})
+        elif collection and edition:
+            call = ("get_nft_metadata_by_name", {"nft_name": f"{collection} #{edition.group(1)}"})
+        elif "popular" in query.lower() or "trending" in query.lower():
+            call = ("get_popular_collections", {"time_range": "1d", "top": 10})
+        elif collection:
+            call = ("get_collection_stats", {"collection_name": collection})
+        else:
+            return {"role": "assistant", "content": "I can only help with Solana NFT questions."}
+        return {"role": "assistant", "content": None,
+                "function_call": {"name": call[0], "arguments": json.dumps(call[1])}}
+
+    def _render_image(self) -> bytes:
+        buffer = io.BytesIO()
+        Image.new("RGB", (512, 512), (64, 96, 160)).save(buffer, "PNG")
+        return buffer.getvalue()
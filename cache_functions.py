@@ -0,0 +1,92 @@
+import copy
+import functools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class TTLCache:
+    # Process-wide LRU cache: entries younger than ttl are fresh, entries within stale_ttl past that
+    # are served immediately while a single background thread refreshes them. Concurrent misses on the
+    # same key share one fetch instead of each calling upstream.
+
+    def __init__(self, ttl: float, stale_ttl: float, maxsize: int = 128):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get_or_fetch(self, key, fetch, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                value, fetched_at = entry
+                age = time.time() - fetched_at
+                if age < ttl:
+                    return copy.deepcopy(value)
+                if age < ttl + self.stale_ttl:
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        threading.Thread(target=self._refresh, args=(key, fetch), daemon=True).start()
+                    return copy.deepcopy(value)
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+
+        if not leader:
+            return copy.deepcopy(future.result())
+        try:
+            value = fetch()
+        except Exception as e:
+            # Waiters see the same failure rather than retrying upstream one after another
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        self._store(key, value)
+        with self._lock:
+            self._inflight.pop(key, None)
+        future.set_result(value)
+        return copy.deepcopy(value)
+
+    def _refresh(self, key, fetch):
+        try:
+            self._store(key, fetch())
+        except Exception as e:
+            print(f"Background refresh failed for {key}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _store(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def ttl_cache(ttl: float, stale_ttl: float, maxsize: int = 128):
+    def decorator(func):
+        cache = TTLCache(ttl, stale_ttl, maxsize)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            return cache.get_or_fetch(key, lambda: func(*args, **kwargs))
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
@@ -1,8 +1,9 @@
-import requests
 import streamlit as st
+import http_functions
 
-api_key = st.secrets.helius_api_key
-URL = f"https://rpc.helius.xyz/?api-key={api_key}"
+
+def rpc_url() -> str:
+    return http_functions.provider_url("helius", f"/?api-key={st.secrets.helius_api_key}")
 
 
 def fetch_nft_data(mint_addresses: list) -> list:
@@ -21,7 +22,7 @@ def fetch_nft_data(mint_addresses: list) -> list:
         for i, mint_address in enumerate(mint_addresses)
     ]
 
-    response = requests.post(URL, headers={"Content-Type": "application/json"}, json=batch)
+    response = http_functions.post("helius", rpc_url(), json=batch)
     response.raise_for_status()
 
     return response.json()
@@ -43,36 +44,39 @@ def extract_nft_data(nft: dict) -> dict:
     return data
 
 
-def get_nfts_by_owner(address: str) -> list:
-    page_number = 1
-    limit = 1000
-    all_nfts = []
+def get_nfts_by_owner_page(address: str, page_number: int, limit: int = 1000) -> list:
+    payload = {
+        "jsonrpc": "2.0",
+        "id": "my-id",
+        "method": "getAssetsByOwner",
+        "params": {
+            "ownerAddress": address,
+            "page": page_number,
+            "limit": limit,
+        },
+    }
 
-    while True:
-        payload = {
-            "jsonrpc": "2.0",
-            "id": "my-id",
-            "method": "getAssetsByOwner",
-            "params": {
-                "ownerAddress": address,
-                "page": page_number,
-                "limit": limit,
-            },
-        }
+    response = http_functions.post("helius", rpc_url(), json=payload)
+    response_data = response.json()
 
-        response = requests.post(URL, headers={"Content-Type": "application/json"}, json=payload)
-        response_data = response.json()
+    if "result" in response_data and "items" in response_data["result"]:
+        return [extract_nft_data(nft) for nft in response_data["result"]["items"]]
+    return []
 
-        if "result" in response_data and "items" in response_data["result"]:
-            nfts = response_data["result"]["items"]
-            processed_nfts = [extract_nft_data(nft) for nft in nfts]
-            all_nfts.extend(processed_nfts)
 
-            if len(nfts) < limit:
-                break
+def iter_nfts_by_owner(address: str, limit: int = 1000):
+    page_number = 1
+
+    while True:
+        nfts = get_nfts_by_owner_page(address, page_number, limit)
+        if nfts:
+            yield nfts
 
-            page_number += 1
-        else:
+        if len(nfts) < limit:
             break
 
-    return all_nfts
+        page_number += 1
+
+
+def get_nfts_by_owner(address: str) -> list:
+    return [nft for page in iter_nfts_by_owner(address) for nft in page]
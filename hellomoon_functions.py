@@ -1,25 +1,28 @@
+import math
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from collections import OrderedDict
-import streamlit as st
+import http_functions
+from cache_functions import ttl_cache
+from tracing_functions import span
 
-token = st.secrets.hellomoon_api_key
+MINT_PAGE_SIZE = 100
+MINT_PAGE_WINDOW = 8
+MINT_PAGE_RETRIES = 4
+COLLECTION_STATS_TTL = 120
+COLLECTION_STATS_STALE_TTL = 600
 
 
 def get_hello_moon_collection_id(collection_name: str) -> tuple:
-    url = "https://rest-api.hellomoon.io/v0/nft/collection/name"
+    url = http_functions.provider_url("hellomoon", "/v0/nft/collection/name")
 
     payload = {
         "searchStrategy": "levenshtein",
         "collectionName": collection_name
     }
 
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "authorization": f"Bearer {token}"
-    }
-
-    response = requests.post(url, json=payload, headers=headers)
+    response = http_functions.post("hellomoon", url, json=payload)
     response.raise_for_status()
     data = response.json()
     if not data["data"]:
@@ -31,53 +34,93 @@ def get_hello_moon_collection_id(collection_name: str) -> tuple:
     return hello_moon_id, retrieved_collection_name
 
 
-def get_mint_addresses(hello_moon_id: str) -> list:
-    url = "https://rest-api.hellomoon.io/v0/nft/collection/mints"
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "authorization": f"Bearer {token}"
-    }
+def fetch_mint_page(hello_moon_id: str, page: int) -> list:
+    url = http_functions.provider_url("hellomoon", "/v0/nft/collection/mints")
 
-    mint_addresses = []
-    page = 1
+    print(f"Fetching page {page}...")
+    payload = {
+        "helloMoonCollectionId": hello_moon_id,
+        "limit": MINT_PAGE_SIZE,
+        "page": page
+    }
 
+    # A window of parallel pages is the likeliest thing to hit HelloMoon's rate limit, so throttled pages and
+    # timed-out or dropped requests are retried here rather than failing the whole paginator
+    attempt = 0
     while True:
-        print(f"Fetching page {page}...")
-        payload = {
-            "helloMoonCollectionId": hello_moon_id,
-            "limit": 100,
-            "page": page
-        }
+        try:
+            response = http_functions.post("hellomoon", url, json=payload)
+        except requests.RequestException as e:
+            if attempt == MINT_PAGE_RETRIES:
+                raise
+            attempt += 1
+            delay = http_functions.retry_delay(None, attempt)
+            print(f"Request for page {page} failed ({e}). Retrying in {delay:.1f} seconds...")
+            time.sleep(delay)
+            continue
+        if response.status_code not in http_functions.RETRY_STATUSES or attempt == MINT_PAGE_RETRIES:
+            break
+        attempt += 1
+        delay = http_functions.retry_delay(response, attempt)
+        print(f"HelloMoon returned {response.status_code} for page {page}. Retrying in {delay:.1f} seconds...")
+        time.sleep(delay)
+    response.raise_for_status()
+    data = response.json().get("data", [])
 
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status()
-        data = response.json().get("data", [])
+    return [item["nftMint"] for item in data]
 
-        if not data:
-            break
 
-        mint_addresses.extend([item["nftMint"] for item in data])
-        page += 1
+def iter_mint_address_pages(hello_moon_id: str, supply: int = None, window: int = MINT_PAGE_WINDOW,
+                            start_page: int = 1):
+    # Pages are requested in a sliding window of parallel calls and yielded in page order.
+    # A known supply caps the window at one page past the planned count; if that page
+    # still has mints the supply was stale and we fall back to speculative windows.
+    last_page = max(math.ceil(supply / MINT_PAGE_SIZE) + 1, start_page) if supply else None
+    executor = ThreadPoolExecutor(max_workers=window)
+    pending = deque()
+    next_page = start_page
+
+    try:
+        while True:
+            while len(pending) < window and (last_page is None or next_page <= last_page):
+                pending.append((next_page, executor.submit(fetch_mint_page, hello_moon_id, next_page)))
+                next_page += 1
+
+            if not pending:
+                break
+
+            page, future = pending.popleft()
+            mints = future.result()
+            if not mints:
+                break
+
+            if page == last_page:
+                last_page = None
+            yield mints
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def get_mint_addresses(hello_moon_id: str, supply: int = None) -> list:
+    with span("hellomoon.get_mint_addresses", supply=supply) as current:
+        pages = list(iter_mint_address_pages(hello_moon_id, supply))
+        mint_addresses = [mint for page in pages for mint in page]
+        current.set(page_count=len(pages), mints=len(mint_addresses))
 
     print(f"Found {len(mint_addresses)} mint addresses.")
     return mint_addresses
 
 
+@ttl_cache(ttl=COLLECTION_STATS_TTL, stale_ttl=COLLECTION_STATS_STALE_TTL, maxsize=256)
 def fetch_collection_stats(collectionId):
-    url = "https://rest-api.hellomoon.io/v0/nft/collection/leaderboard/stats"
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "authorization": f"Bearer {token}"
-    }
+    url = http_functions.provider_url("hellomoon", "/v0/nft/collection/leaderboard/stats")
 
     payload = {
         "helloMoonCollectionId": collectionId,
         "granularity": ["THIRTY_MIN", "ONE_HOUR", "SIX_HOUR", "HALF_DAY", "ONE_DAY", "ONE_WEEK", "ONE_MONTH"]
     }
 
-    response = requests.post(url, json=payload, headers=headers)
+    response = http_functions.post("hellomoon", url, json=payload)
     response_data = response.json()
 
     # Renaming fields directly after fetching
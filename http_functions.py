@@ -0,0 +1,109 @@
+import random
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+import streamlit as st
+from tracing_functions import span
+
+# (connect, read) seconds
+DEFAULT_TIMEOUT = (5, 60)
+POOL_MAXSIZE = 32
+# Rate limiting and transient upstream failures; anything else is returned to the caller as-is
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 10
+MAX_RETRY_AFTER = 60
+# Overridable per deployment (e.g. "helius_base_url" in secrets) so the app can run against local stand-ins
+PROVIDER_BASE_URLS = {
+    "helius": "https://rpc.helius.xyz",
+    "hellomoon": "https://rest-api.hellomoon.io",
+    "magiceden": "https://api-mainnet.magiceden.dev",
+}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def provider_headers(provider: str) -> dict:
+    if provider == "helius":
+        return {"Content-Type": "application/json"}
+    if provider == "hellomoon":
+        return {
+            "accept": "application/json",
+            "content-type": "application/json",
+            "authorization": f"Bearer {st.secrets.hellomoon_api_key}"
+        }
+    if provider == "magiceden":
+        return {"accept": "application/json"}
+    if provider == "images":
+        return {"accept": "image/*"}
+    raise ValueError(f"Unknown provider {provider}")
+
+
+def provider_url(provider: str, path: str) -> str:
+    return st.secrets.get(f"{provider}_base_url", PROVIDER_BASE_URLS[provider]).rstrip("/") + path
+
+
+def get_session(provider: str) -> requests.Session:
+    # One keep-alive session per provider, shared by every thread and Streamlit session
+    with _sessions_lock:
+        session = _sessions.get(provider)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(provider_headers(provider))
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[provider] = session
+        return session
+
+
+def request(provider: str, method: str, url: str, **kwargs) -> requests.Response:
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    payload = kwargs.get("json")
+    # Path only: Helius carries its api key in the query string
+    attributes = {"method": method, "path": urlsplit(url).path}
+    if isinstance(payload, list):
+        attributes["batch_size"] = len(payload)
+    elif isinstance(payload, dict):
+        attributes.update({key: payload[key] for key in ("method", "page", "limit") if key in payload})
+    with span(f"http.{provider}", **attributes) as current:
+        response = get_session(provider).request(method, url, **kwargs)
+        current.set(status=response.status_code)
+        return response
+
+
+def retry_after(response: requests.Response) -> Optional[float]:
+    # Retry-After is either delta-seconds or an HTTP date; capped so a bad header can't stall a worker
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0), MAX_RETRY_AFTER)
+
+
+def retry_delay(response: Optional[requests.Response], attempt: int) -> float:
+    # The provider's Retry-After when it sent one, otherwise exponential backoff with full jitter.
+    # response is None when the request itself failed (timeout, dropped connection).
+    delay = retry_after(response) if response is not None else None
+    if delay is None:
+        delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+    return delay
+
+
+def get(provider: str, url: str, **kwargs) -> requests.Response:
+    return request(provider, "GET", url, **kwargs)
+
+
+def post(provider: str, url: str, **kwargs) -> requests.Response:
+    return request(provider, "POST", url, **kwargs)
@@ -0,0 +1,190 @@
+import hashlib
+import io
+import ipaddress
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+from PIL import Image
+import streamlit as st
+import http_functions
+
+# Streamlit serves ./static at app/static when server.enableStaticServing is on
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+THUMBNAIL_DIR = os.path.join(STATIC_DIR, "thumbnails")
+URL_INDEX_DIR = os.path.join(THUMBNAIL_DIR, "urls")
+THUMBNAIL_URL_PREFIX = "app/static/thumbnails"
+
+IMAGE_SIZES = {"card": 400, "detail": 700}
+IMAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Eviction goes a little below the cap so the next few inserts don't each trigger another directory scan
+IMAGE_CACHE_LOW_WATER_BYTES = IMAGE_CACHE_MAX_BYTES * 9 // 10
+MAX_SOURCE_IMAGE_BYTES = 30 * 1024 * 1024
+MAX_IMAGE_REDIRECTS = 3
+IPFS_GATEWAY = "https://ipfs.io/ipfs/"
+ARWEAVE_GATEWAY = "https://arweave.net/"
+
+_fetch_executor = ThreadPoolExecutor(max_workers=8)
+_pending_urls = set()
+_pending_urls_lock = threading.Lock()
+_evict_lock = threading.Lock()
+# Bytes of thumbnails on disk: counted once, then kept current by cache_image and rescanned only to evict
+_cache_bytes = None
+
+
+def source_url(url: str) -> str:
+    if url.startswith("ipfs://"):
+        return IPFS_GATEWAY + url[len("ipfs://"):].lstrip("/").removeprefix("ipfs/")
+    if url.startswith("ar://"):
+        return ARWEAVE_GATEWAY + url[len("ar://"):]
+    return url
+
+
+def url_index_path(url: str) -> str:
+    return os.path.join(URL_INDEX_DIR, hashlib.sha256(url.encode()).hexdigest())
+
+
+def thumbnail_name(content_hash: str, size: str) -> str:
+    return f"{content_hash}-{size}.webp"
+
+
+def cached_thumbnail(url: str, size: str):
+    try:
+        with open(url_index_path(url)) as index_file:
+            content_hash = index_file.read().strip()
+    except OSError:
+        return None
+
+    name = thumbnail_name(content_hash, size)
+    path = os.path.join(THUMBNAIL_DIR, name)
+    try:
+        # Touch on access so eviction removes the least recently viewed images first
+        os.utime(path)
+    except OSError:
+        return None
+    return name
+
+
+def thumbnail_url(url: str, size: str = "card") -> str:
+    # Local thumbnail when we have one; otherwise the original URL while a background fetch fills the cache
+    if not url or not url.startswith(("http://", "https://", "ipfs://", "ar://")):
+        return url
+
+    name = cached_thumbnail(url, size)
+    if name:
+        return f"{THUMBNAIL_URL_PREFIX}/{name}"
+
+    with _pending_urls_lock:
+        if url not in _pending_urls:
+            _pending_urls.add(url)
+            _fetch_executor.submit(cache_image, url)
+    return source_url(url)
+
+
+def is_public_host(host: str) -> bool:
+    # Image URLs come from on-chain metadata, so anyone can point one at our network; every address the
+    # host resolves to must be publicly routable. Benchmarks allowlist their local stand-in.
+    if host in st.secrets.get("image_host_allowlist", []):
+        return True
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None)}
+    except (socket.gaierror, UnicodeError):
+        return False
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%", 1)[0])
+        if not ip.is_global or ip.is_multicast:
+            return False
+    return bool(addresses)
+
+
+def check_image_url(url: str):
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https"):
+        raise ValueError(f"Unsupported image URL scheme {parts.scheme!r}")
+    if not parts.hostname or not is_public_host(parts.hostname):
+        raise ValueError(f"Image host {parts.hostname!r} is not publicly routable")
+
+
+def fetch_image(url: str):
+    # Redirects are followed by hand so every hop is checked, not just the URL from the metadata
+    for _ in range(MAX_IMAGE_REDIRECTS + 1):
+        check_image_url(url)
+        response = http_functions.get("images", url, stream=True, allow_redirects=False)
+        if not response.is_redirect:
+            return response
+        response.close()
+        url = urljoin(url, response.headers["Location"])
+    raise ValueError(f"Too many redirects for image {url}")
+
+
+def cache_image(url: str):
+    try:
+        response = fetch_image(source_url(url))
+        response.raise_for_status()
+        content = response.raw.read(MAX_SOURCE_IMAGE_BYTES + 1, decode_content=True)
+        if len(content) > MAX_SOURCE_IMAGE_BYTES:
+            print(f"Skipping oversized image {url}")
+            return
+
+        content_hash = hashlib.sha256(content).hexdigest()
+        os.makedirs(URL_INDEX_DIR, exist_ok=True)
+
+        written = 0
+        with Image.open(io.BytesIO(content)) as image:
+            image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+            for size, pixels in IMAGE_SIZES.items():
+                path = os.path.join(THUMBNAIL_DIR, thumbnail_name(content_hash, size))
+                if not os.path.exists(path):
+                    resized = image.copy()
+                    resized.thumbnail((pixels, pixels))
+                    resized.save(path + ".tmp", "WEBP", quality=80)
+                    os.replace(path + ".tmp", path)
+                    written += os.path.getsize(path)
+
+        with open(url_index_path(url), "w") as index_file:
+            index_file.write(content_hash)
+
+        record_thumbnail_bytes(written)
+    except Exception as e:
+        print(f"Failed to cache image {url}: {e}")
+    finally:
+        with _pending_urls_lock:
+            _pending_urls.discard(url)
+
+
+def thumbnail_entries() -> list:
+    entries = []
+    for entry in os.scandir(THUMBNAIL_DIR):
+        if entry.is_file() and entry.name.endswith(".webp"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    return entries
+
+
+def record_thumbnail_bytes(written: int):
+    global _cache_bytes
+    with _evict_lock:
+        if _cache_bytes is None:
+            # The first scan already sees the thumbnails just written
+            _cache_bytes = sum(size for _, size, _ in thumbnail_entries())
+        else:
+            _cache_bytes += written
+        if _cache_bytes > IMAGE_CACHE_MAX_BYTES:
+            _cache_bytes = evict_thumbnails()
+
+
+def evict_thumbnails() -> int:
+    # Least recently viewed first; rescans so files added or removed by other processes are counted.
+    # Called with _evict_lock held; returns the bytes left on disk.
+    entries = thumbnail_entries()
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_bytes <= IMAGE_CACHE_LOW_WATER_BYTES:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
+    return total_bytes
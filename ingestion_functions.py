@@ -0,0 +1,411 @@
+import math
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import streamlit as st
+from helius_functions import fetch_nft_data
+from hellomoon_functions import MINT_PAGE_SIZE, iter_mint_address_pages, fetch_collection_stats
+from mongodb_functions import insert_failed_chunks, insert_nft_metadata, claim_ingestion_checkpoint, update_ingestion_checkpoint, mark_chunk_written, mark_chunk_failed, complete_partial_ingestion, claim_failed_chunk, reschedule_failed_chunk, delete_failed_chunk, get_collection_info, get_nft_metadata_by_edition, get_ingestion_checkpoint, rebuild_trait_index, update_collection_rarity, get_collections_without_trait_index
+from name_functions import parse_edition
+from snapshot_functions import export_collection_snapshot, has_collection_snapshot, restore_collection_snapshot
+from tracing_functions import span
+
+CHUNK_SIZE = 1000
+MAX_RETRIES = 5
+BASE_RETRY_DELAY = 1
+MAX_RETRY_DELAY = 30
+DEFAULT_CONCURRENCY = 4
+PAGES_PER_CHUNK = CHUNK_SIZE // MINT_PAGE_SIZE
+STALE_CHECKPOINT = timedelta(minutes=10)
+FAILED_CHUNK_LEASE = timedelta(minutes=10)
+FAILED_CHUNK_POLL_SECONDS = 60
+MAX_FAILED_CHUNK_RETRY_DELAY = timedelta(hours=6)
+MAX_CONCURRENT_INGESTIONS = 2
+REMOTE_INGESTION_POLL_SECONDS = 2
+REMOTE_INGESTION_TIMEOUT = 300
+INGESTION_PROGRESS_INTERVAL = 0.5
+INGESTION_WAIT_TIMEOUT = 600
+QUEUE_POLL_SECONDS = 1
+
+_ingestion_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_INGESTIONS)
+_ingestion_jobs = {}
+_ingestion_jobs_lock = threading.Lock()
+
+_DONE = object()
+
+
+def retry_delay(attempt: int) -> float:
+    # Exponential backoff with full jitter so parallel chunks don't retry in lockstep
+    return random.uniform(0, min(MAX_RETRY_DELAY, BASE_RETRY_DELAY * 2 ** attempt))
+
+
+def is_valid_metadata(item: dict) -> bool:
+    result = item.get('result')
+    return (isinstance(result, dict) and 'id' in result and 'content' in result and
+            'metadata' in result['content'] and 'name' in result['content']['metadata'])
+
+
+def fetch_chunk(chunk: list, index: int) -> list:
+    attempt = 0
+    while True:
+        try:
+            with span("ingestion.fetch_chunk", chunk=index, batch_size=len(chunk), attempt=attempt):
+                nft_data = fetch_nft_data(chunk)
+            print(f"Successfully fetched data for chunk number {index}")
+            return [item for item in nft_data if is_valid_metadata(item)]
+        except Exception as e:
+            attempt += 1
+            if attempt == MAX_RETRIES:
+                raise
+            delay = retry_delay(attempt)
+            print(f"Error encountered for chunk number {index}: {e}. Retrying in {delay:.1f} seconds...")
+            time.sleep(delay)
+
+
+def iter_mint_chunks(pages, size: int):
+    chunk = []
+    for page in pages:
+        chunk.extend(page)
+        while len(chunk) >= size:
+            yield chunk[:size]
+            chunk = chunk[size:]
+    if chunk:
+        yield chunk
+
+
+class CollectionIngestion:
+    # Mint pages -> Helius getAsset batches -> Mongo bulk writes, each stage on its own
+    # thread(s) and joined by bounded queues so a slow stage throttles the ones before it.
+
+    def __init__(self, collectionId: str, collectionName: str, collection_info_id, concurrency: int = None,
+                 supply: int = None):
+        self.collectionId = collectionId
+        self.collectionName = collectionName
+        self.collection_info_id = collection_info_id
+        self.supply = supply
+        self.concurrency = concurrency or st.secrets.get("ingestion_concurrency", DEFAULT_CONCURRENCY)
+
+        self._chunk_queue = queue.Queue(maxsize=self.concurrency)
+        self._write_queue = queue.Queue(maxsize=self.concurrency)
+        self._watched = {}
+        self._lock = threading.Lock()
+        self._failed_chunks = 0
+        self._unrecorded_failures = 0
+        self._producer_failed = False
+        self._writer_failed = False
+        # Set when the writer gives up, so the producer and fetchers stop instead of blocking on full queues
+        self._stop = threading.Event()
+        self._chunks_written = 0
+        self.status = "queued"
+        self.remote = False
+        self.restored = False
+        self.done = threading.Event()
+
+    def watch(self, edition: int) -> threading.Event:
+        # Set once the chunk holding this edition is written, or when ingestion finishes
+        with self._lock:
+            event = self._watched.setdefault(edition, threading.Event())
+            if self.done.is_set():
+                event.set()
+            return event
+
+    def progress(self) -> dict:
+        total_chunks = math.ceil(self.supply / CHUNK_SIZE) if self.supply else None
+        with self._lock:
+            return {"status": self.status, "chunks_written": self._chunks_written, "total_chunks": total_chunks,
+                    "fraction": min(1.0, self._chunks_written / total_chunks) if total_chunks else 0.0}
+
+    def run(self):
+        with span("ingestion.run", collection=self.collectionName) as current:
+            self.start()
+            self.done.wait()
+            current.set(status=self.status, supply=self.supply, chunks_written=self._chunks_written,
+                        restored=self.restored)
+        if self.status == "complete":
+            compute_collection_rarity(self.collection_info_id, self.collectionName)
+        if self.status == "complete" and not self.restored:
+            try:
+                export_collection_snapshot(self.collectionId, self.collectionName, self.collection_info_id)
+            except Exception as e:
+                print(f"Failed to export a snapshot of {self.collectionName}: {e}")
+
+    def start(self):
+        # Resumes from the collection's checkpoint: paging restarts at the first chunk not yet written
+        # and chunks already written by an earlier run are skipped
+        checkpoint = claim_ingestion_checkpoint(self.collectionId, self.collectionName, self.collection_info_id,
+                                                STALE_CHECKPOINT)
+        if checkpoint is None:
+            print(f"{self.collectionName} is being ingested by another process")
+            self.remote = True
+            self._set_done("remote")
+            return self
+
+        self.status = "running"
+        if not checkpoint.get("chunks_written") and has_collection_snapshot(self.collectionId):
+            if self._restore_snapshot():
+                return self
+
+        self._get_supply()
+        self._written_chunks = set(checkpoint.get("chunks_written", []))
+        self._chunks_written = len(self._written_chunks)
+        self._first_chunk = next(index for index in range(1, len(self._written_chunks) + 2)
+                                 if index not in self._written_chunks)
+        if self._written_chunks:
+            print(f"Resuming ingestion of {self.collectionName} at chunk {self._first_chunk}")
+
+        threads = [threading.Thread(target=self._produce_chunks, daemon=True),
+                   threading.Thread(target=self._write_batches, daemon=True)]
+        threads += [threading.Thread(target=self._fetch_chunks, daemon=True) for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        return self
+
+    def _restore_snapshot(self) -> bool:
+        # Falls back to crawling (the caller carries on) if the snapshot cannot be loaded
+        try:
+            with span("ingestion.restore_snapshot", collection=self.collectionName) as current:
+                restored = restore_collection_snapshot(self.collectionId, self.collection_info_id)
+                current.set(mints=restored)
+        except Exception as e:
+            print(f"Failed to restore {self.collectionName} from its snapshot, crawling instead: {e}")
+            return False
+
+        print(f"Restored {restored} NFTs of {self.collectionName} from its snapshot")
+        self.restored = True
+        try:
+            update_ingestion_checkpoint(self.collectionId, status="complete", restored_from_snapshot=True)
+        finally:
+            self._set_done("complete")
+        return True
+
+    def _produce_chunks(self):
+        start_page = (self._first_chunk - 1) * PAGES_PER_CHUNK + 1
+        try:
+            pages = iter_mint_address_pages(self.collectionId, self._get_supply(), start_page=start_page)
+            for index, chunk in enumerate(iter_mint_chunks(pages, CHUNK_SIZE), self._first_chunk):
+                update_ingestion_checkpoint(self.collectionId, pages_fetched=index * PAGES_PER_CHUNK)
+                if self._stop.is_set():
+                    return
+                if index not in self._written_chunks:
+                    self._put(self._chunk_queue, (index, chunk))
+        except Exception as e:
+            self._producer_failed = True
+            print(f"Failed to fetch mint addresses for {self.collectionName}: {e}")
+        finally:
+            for _ in range(self.concurrency):
+                self._put(self._chunk_queue, _DONE)
+
+    def _put(self, stage_queue: queue.Queue, item) -> bool:
+        # Blocks like put() while the next stage is busy, but gives up once the job is stopping
+        while not self._stop.is_set():
+            try:
+                stage_queue.put(item, timeout=QUEUE_POLL_SECONDS)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self, stage_queue: queue.Queue):
+        while True:
+            try:
+                return stage_queue.get(timeout=QUEUE_POLL_SECONDS)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return _DONE
+
+    def _get_supply(self):
+        if self.supply is None:
+            try:
+                self.supply = fetch_collection_stats(self.collectionId).get("supply")
+            except Exception as e:
+                print(f"Could not fetch supply for {self.collectionName}, paging speculatively: {e}")
+        return self.supply
+
+    def _fetch_chunks(self):
+        # The writer counts one _DONE per fetcher, so it is posted however this thread exits
+        try:
+            while True:
+                item = self._get(self._chunk_queue)
+                if item is _DONE or self._stop.is_set():
+                    return
+
+                index, chunk = item
+                try:
+                    self._put(self._write_queue, (index, fetch_chunk(chunk, index)))
+                except Exception as e:
+                    print(f"Failed to fetch data for chunk number {index} after {MAX_RETRIES} attempts ({e}). Saving to MongoDB...")
+                    self._record_failed_chunk(chunk, index)
+        finally:
+            self._put(self._write_queue, _DONE)
+
+    def _record_failed_chunk(self, chunk: list, index: int):
+        # A chunk that cannot even be recorded is left unwritten, and the job is interrupted so a later run refetches it
+        try:
+            insert_failed_chunks(chunk, index, self.collectionId, self.collectionName)
+            mark_chunk_failed(self.collectionId, index)
+            with self._lock:
+                self._failed_chunks += 1
+        except Exception as e:
+            print(f"Failed to record failed chunk number {index} of {self.collectionName}: {e}")
+            with self._lock:
+                self._unrecorded_failures += 1
+
+    def _write_batches(self):
+        finished_fetchers = 0
+        try:
+            while finished_fetchers < self.concurrency:
+                item = self._write_queue.get()
+                if item is _DONE:
+                    finished_fetchers += 1
+                    continue
+
+                index, batch = item
+                if batch:
+                    with span("ingestion.write_chunk", chunk=index, batch_size=len(batch)):
+                        insert_nft_metadata(batch, self.collection_info_id)
+                    self._notify_watchers(batch)
+                mark_chunk_written(self.collectionId, index)
+                with self._lock:
+                    self._chunks_written += 1
+        except Exception as e:
+            self._writer_failed = True
+            self._stop.set()
+            print(f"Failed to write NFT metadata for {self.collectionName}, stopping ingestion: {e}")
+        finally:
+            self._finish()
+
+    def _finish(self):
+        # "partial" collections are completed by the failed-chunk worker; "interrupted" ones resume on the next request
+        if self._producer_failed or self._writer_failed or self._unrecorded_failures:
+            status = "interrupted"
+        elif self._failed_chunks:
+            status = "partial"
+        else:
+            status = "complete"
+        try:
+            update_ingestion_checkpoint(self.collectionId, status=status)
+        finally:
+            self._set_done(status)
+
+    def _set_done(self, status: str):
+        with self._lock:
+            self.status = status
+            self.done.set()
+            for event in self._watched.values():
+                event.set()
+
+    def _notify_watchers(self, batch: list):
+        with self._lock:
+            if not self._watched:
+                return
+            editions = {parse_edition(item['result']['content']['metadata']['name']) for item in batch}
+            for edition, event in self._watched.items():
+                if edition in editions:
+                    event.set()
+
+
+def needs_ingestion(collection_info, checkpoint) -> bool:
+    if collection_info is None:
+        return True
+    if checkpoint is None:
+        # Collections ingested before checkpoints existed are treated as complete
+        return False
+    if checkpoint["status"] == "interrupted":
+        return True
+    return checkpoint["status"] == "running" and datetime.now() - checkpoint["updated_at"] > STALE_CHECKPOINT
+
+
+def get_ingestion_job(collectionId: str):
+    with _ingestion_jobs_lock:
+        job = _ingestion_jobs.get(collectionId)
+        return job if job is not None and not job.done.is_set() else None
+
+
+def submit_ingestion(collectionId: str, collectionName: str, collection_info_id) -> CollectionIngestion:
+    # One job per collection per process; concurrent requesters share it and wait on its watchers
+    with _ingestion_jobs_lock:
+        job = _ingestion_jobs.get(collectionId)
+        if job is None or job.done.is_set():
+            job = CollectionIngestion(collectionId, collectionName, collection_info_id)
+            _ingestion_jobs[collectionId] = job
+            _ingestion_executor.submit(job.run)
+        return job
+
+
+def wait_for_remote_edition(collectionId: str, collection_info_id, edition: int, timeout: float):
+    # Another process owns the ingestion; poll Mongo until the edition lands or that run stops
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        nft_metadata = get_nft_metadata_by_edition(collection_info_id, edition)
+        if nft_metadata:
+            return nft_metadata
+        checkpoint = get_ingestion_checkpoint(collectionId)
+        if checkpoint is None or checkpoint["status"] != "running":
+            return None
+        time.sleep(REMOTE_INGESTION_POLL_SECONDS)
+    return None
+
+
+def failed_chunk_retry_delay(attempts: int) -> timedelta:
+    return min(MAX_FAILED_CHUNK_RETRY_DELAY, timedelta(minutes=2 ** attempts))
+
+
+def retry_failed_chunk(failed_chunk: dict):
+    collectionId = failed_chunk["helloMoonCollectionId"]
+    collection_info = get_collection_info(collectionId)
+    if collection_info is None:
+        delete_failed_chunk(failed_chunk["_id"])
+        return
+
+    try:
+        batch = fetch_chunk(failed_chunk["chunk"], failed_chunk["chunk_number"])
+    except Exception as e:
+        retry_at = datetime.now() + failed_chunk_retry_delay(failed_chunk["attempts"])
+        print(f"Retry of chunk {failed_chunk['chunk_number']} for {failed_chunk['collectionName']} failed ({e}); next attempt at {retry_at}")
+        reschedule_failed_chunk(failed_chunk["_id"], retry_at)
+        return
+
+    if batch:
+        insert_nft_metadata(batch, collection_info["_id"])
+    mark_chunk_written(collectionId, failed_chunk["chunk_number"])
+    delete_failed_chunk(failed_chunk["_id"])
+    if complete_partial_ingestion(collectionId):
+        compute_collection_rarity(collection_info["_id"], failed_chunk["collectionName"])
+    print(f"Recovered chunk {failed_chunk['chunk_number']} for {failed_chunk['collectionName']}")
+
+
+def compute_collection_rarity(collection_info_id, collection_name: str):
+    # Final ingestion stage: the trait index was kept current chunk by chunk, so only the scores need a full pass.
+    # A rebuild first drops index entries left behind by mutable NFTs whose traits changed.
+    with span("ingestion.rarity", collection=collection_name):
+        try:
+            rebuild_trait_index(collection_info_id)
+            update_collection_rarity(collection_info_id)
+        except Exception as e:
+            print(f"Failed to compute trait rarity for {collection_name}: {e}")
+
+
+def backfill_trait_indexes():
+    # Collections stored before the trait index existed never reach the final ingestion stage, so build theirs here
+    for collection_info_id, collection_name in get_collections_without_trait_index():
+        compute_collection_rarity(collection_info_id, collection_name)
+
+
+def drain_failed_chunks():
+    while True:
+        failed_chunk = claim_failed_chunk(FAILED_CHUNK_LEASE)
+        if failed_chunk is None:
+            return
+        retry_failed_chunk(failed_chunk)
+
+
+def run_failed_chunk_worker():
+    while True:
+        try:
+            drain_failed_chunks()
+        except Exception as e:
+            print(f"Failed chunk worker error: {e}")
+        time.sleep(FAILED_CHUNK_POLL_SECONDS)
@@ -1,9 +1,14 @@
-import requests
 import json
 import streamlit as st
+import http_functions
+from cache_functions import TTLCache
 
+# Shorter windows move faster, so their cached rankings expire sooner
+POPULAR_COLLECTIONS_TTL = {"1h": 60, "1d": 300, "7d": 900, "30d": 1800}
+popular_collections_cache = TTLCache(ttl=300, stale_ttl=900, maxsize=16)
 
-def get_popular_collections(time_range="1d", top=10):
+
+def normalize_time_range(time_range: str) -> str:
     if time_range.endswith('d'):
         num_days = int(time_range[:-1])
         if num_days <= 1:
@@ -14,14 +19,14 @@ def get_popular_collections(time_range="1d", top=10):
             time_range = "30d"
     if time_range.endswith('h'):
         time_range = "1h"
+    return time_range
 
-    st.write({"time_range": time_range, "top": top})
 
-    url = "https://api-mainnet.magiceden.dev/v2/marketplace/popular_collections"
-    headers = {"accept": "application/json"}
+def fetch_popular_collections(time_range: str) -> list:
+    url = http_functions.provider_url("magiceden", "/v2/marketplace/popular_collections")
     params = {"timeRange": time_range}
 
-    response = requests.get(url, headers=headers, params=params)
+    response = http_functions.get("magiceden", url, params=params)
 
     if response.status_code == 200:
         data = json.loads(response.text)
@@ -31,7 +36,24 @@ def get_popular_collections(time_range="1d", top=10):
 
             collection['floorPrice'] = collection['floorPrice'] / 1_000_000_000
 
-        limited_data = data[:top]
-        return limited_data
+        return data
     else:
         response.raise_for_status()
+        raise ValueError(f"Unexpected Magic Eden response status {response.status_code}")
+
+
+def popular_collections(time_range: str) -> list:
+    # The full ranking is cached once per time range and sliced per request
+    return popular_collections_cache.get_or_fetch(
+        time_range, lambda: fetch_popular_collections(time_range), ttl=POPULAR_COLLECTIONS_TTL.get(time_range)
+    )
+
+
+def get_popular_collections(time_range="1d", top=10):
+    time_range = normalize_time_range(time_range)
+
+    st.write({"time_range": time_range, "top": top})
+
+    data = popular_collections(time_range)
+    limited_data = data[:top]
+    return limited_data
@@ -1,32 +1,533 @@
-from pymongo import MongoClient, InsertOne
+import bson
+import difflib
+import json
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import MongoClient, ReplaceOne, UpdateOne, UpdateMany, ASCENDING, ReturnDocument
+from pymongo.errors import BulkWriteError, CollectionInvalid, DuplicateKeyError, OperationFailure
+from bson import Binary, ObjectId
 from typing import Optional, Dict
-from datetime import datetime
+from datetime import datetime, timedelta
 import streamlit as st
+from name_functions import lookup_keys, normalize_name
+from tracing_functions import MongoCommandListener
 
-client = MongoClient(st.secrets.MONGODB_URI)
-db = client['Vtopia']
-nft_metadata_collection = db['nft_metadata']
-collection_info_collection = db['collection_info']
-failed_chunks_collection = db['failed_chunks']
+DATABASE_NAME = 'Vtopia'
 
 
-def insert_nft_metadata(metadata, collection):
-    if isinstance(metadata, list):
-        results = [{**doc['result'], 'collection': collection} for doc in metadata]
+@st.cache_resource(show_spinner=False)
+def get_client() -> MongoClient:
+    # Built on first use and shared by every session and rerun, so importing this module costs nothing
+    return MongoClient(st.secrets.MONGODB_URI, event_listeners=[MongoCommandListener()])
+
+
+def get_database():
+    return get_client()[DATABASE_NAME]
+
+
+class LazyCollection:
+    # Stands in for a pymongo Collection and resolves it on first attribute access
+
+    def __init__(self, name: str):
+        self.name = name
+        self._collection = None
+
+    def __getattr__(self, attribute):
+        if self._collection is None:
+            self._collection = get_database()[self.name]
+        return getattr(self._collection, attribute)
+
+
+nft_metadata_collection = LazyCollection('nft_metadata')
+collection_info_collection = LazyCollection('collection_info')
+failed_chunks_collection = LazyCollection('failed_chunks')
+collection_aliases_collection = LazyCollection('collection_aliases')
+llm_cache_collection = LazyCollection('llm_cache')
+wallet_snapshots_collection = LazyCollection('wallet_snapshots')
+ingestion_checkpoints_collection = LazyCollection('ingestion_checkpoints')
+nft_blobs_collection = LazyCollection('nft_blobs')
+trait_index_collection = LazyCollection('trait_index')
+collection_stats_collection = LazyCollection('collection_stats')
+collection_stats_hourly_collection = LazyCollection('collection_stats_hourly')
+collection_stats_daily_collection = LazyCollection('collection_stats_daily')
+stats_jobs_collection = LazyCollection('stats_jobs')
+
+DUPLICATE_KEY_ERROR = 11000
+LLM_CACHE_TTL = 7 * 24 * 60 * 60
+# Well under the 48MB wire message limit so one batch never has to be split mid-flight
+MAX_BULK_BATCH_BYTES = 8 * 1024 * 1024
+MAX_BULK_BATCH_DOCS = 5000
+MAX_DOCUMENT_BYTES = 16 * 1024 * 1024
+# Rarely read and often the bulk of a getAsset result, so they live compressed in nft_blobs
+NFT_BLOB_FIELDS = ("files", "authorities")
+# content, grouping and authorities only exist on legacy raw documents not yet compacted by
+# compact_legacy_nft_metadata; show_nft_data compacts those on read
+NFT_METADATA_PROJECTION = {"_id": 0, "id": 1, "name": 1, "symbol": 1, "description": 1, "image": 1, "traits": 1,
+                           "collection_address": 1, "website": 1, "creators": 1, "royalty": 1, "supply": 1,
+                           "burnt": 1, "interface": 1, "mutable": 1, "collection": 1, "rarity_score": 1,
+                           "rarity_rank": 1, "content": 1, "grouping": 1, "authorities": 1}
+LEGACY_NAME_INDEX = "collection_1_content.metadata.name_1"
+# Collection stats snapshots, finest first: (collection, $dateTrunc unit of its points, retention in seconds)
+STATS_TIERS = {
+    "raw": (collection_stats_collection, None, 3 * 24 * 60 * 60),
+    "hourly": (collection_stats_hourly_collection, "hour", 90 * 24 * 60 * 60),
+    "daily": (collection_stats_daily_collection, "day", None),
+}
+STATS_METRICS = ("floorPrice", "listing_count", "current_owner_count", "market_cap_sol", "avg_price_sol", "volume_1d")
+
+# Collections this process has already compacted on demand, so a genuine miss doesn't re-check every time
+_compacted_collections = set()
+
+
+def create_unique_index(collection, keys) -> bool:
+    try:
+        collection.create_index(keys, unique=True)
+        return True
+    except OperationFailure as e:
+        # Existing duplicates (or an older non-unique index) rule out uniqueness for now
+        print(f"Could not create unique index {keys} on {collection.name}: {e}. Falling back to non-unique.")
+        collection.create_index(keys)
+        return False
+
+
+def has_unique_index(collection, field: str) -> bool:
+    return any(index.get("unique") and list(index["key"]) == [(field, ASCENDING)]
+               for index in collection.index_information().values())
+
+
+def dedupe_nft_metadata() -> int:
+    # Keeps the newest document per mint; duplicates only come from upserts racing before the unique index existed
+    removed = 0
+    duplicates = nft_metadata_collection.aggregate([
+        {"$group": {"_id": "$id", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ], allowDiskUse=True)
+    for group in duplicates:
+        removed += nft_metadata_collection.delete_many({"_id": {"$in": sorted(group["ids"])[:-1]}}).deleted_count
+    if removed:
+        print(f"Removed {removed} duplicate NFT metadata documents")
+    return removed
+
+
+def ensure_indexes():
+    create_unique_index(collection_info_collection, [("helloMoonCollectionId", ASCENDING)])
+    # $merge on id (rarity scores) requires this index to be unique, so duplicates are cleared rather than tolerated
+    if not create_unique_index(nft_metadata_collection, [("id", ASCENDING)]):
+        dedupe_nft_metadata()
+        nft_metadata_collection.drop_index([("id", ASCENDING)])
+        create_unique_index(nft_metadata_collection, [("id", ASCENDING)])
+    create_unique_index(collection_aliases_collection, [("alias", ASCENDING)])
+    create_unique_index(llm_cache_collection, [("key", ASCENDING)])
+    llm_cache_collection.create_index([("created_at", ASCENDING)], expireAfterSeconds=LLM_CACHE_TTL)
+    llm_cache_collection.create_index([("last_hit_at", ASCENDING)])
+    create_unique_index(wallet_snapshots_collection, [("owner", ASCENDING)])
+    try:
+        nft_metadata_collection.drop_index(LEGACY_NAME_INDEX)
+    except OperationFailure:
+        pass
+    nft_metadata_collection.create_index([("collection", ASCENDING), ("name", ASCENDING)])
+    nft_metadata_collection.create_index([("collection", ASCENDING), ("edition", ASCENDING)])
+    nft_metadata_collection.create_index([("collection_key", ASCENDING), ("edition", ASCENDING)])
+    failed_chunks_collection.create_index([("helloMoonCollectionId", ASCENDING), ("chunk_number", ASCENDING)])
+    failed_chunks_collection.create_index([("next_retry_at", ASCENDING)])
+    create_unique_index(ingestion_checkpoints_collection, [("helloMoonCollectionId", ASCENDING)])
+    create_unique_index(nft_blobs_collection, [("id", ASCENDING)])
+    create_unique_index(trait_index_collection, [("collection", ASCENDING), ("trait_type", ASCENDING), ("value", ASCENDING)])
+    ensure_stats_collections()
+
+
+def ensure_stats_collections():
+    # Time-series collections must be created explicitly; expired points are dropped by the server per bucket
+    for tier, (collection, unit, retention) in STATS_TIERS.items():
+        options = {"timeseries": {"timeField": "ts", "metaField": "meta", "granularity": f"{unit or 'minute'}s"}}
+        if retention:
+            options["expireAfterSeconds"] = retention
+        try:
+            get_database().create_collection(collection.name, **options)
+        except CollectionInvalid:
+            pass
+        collection.create_index([("meta.collection", ASCENDING), ("ts", ASCENDING)])
+
+
+def hot_path_queries() -> list:
+    return [
+        (collection_info_collection, {"helloMoonCollectionId": ""}),
+        (nft_metadata_collection, {"id": ""}),
+        (nft_metadata_collection, {"collection": ObjectId(), "name": ""}),
+        (nft_metadata_collection, {"collection": ObjectId(), "edition": 0}),
+        (nft_metadata_collection, {"collection_key": "", "edition": 0}),
+        (failed_chunks_collection, {"helloMoonCollectionId": ""}),
+        (collection_aliases_collection, {"alias": ""}),
+        (llm_cache_collection, {"key": ""}),
+        (wallet_snapshots_collection, {"owner": ""}),
+        (ingestion_checkpoints_collection, {"helloMoonCollectionId": ""}),
+        (nft_blobs_collection, {"id": ""}),
+        (trait_index_collection, {"collection": ObjectId(), "trait_type": "", "value": ""}),
+    ]
+
+
+def plan_stages(plan) -> list:
+    if isinstance(plan, list):
+        return [stage for item in plan for stage in plan_stages(item)]
+    if not isinstance(plan, dict):
+        return []
+    stages = [plan["stage"]] if "stage" in plan else []
+    return stages + [stage for value in plan.values() for stage in plan_stages(value)]
+
+
+def verify_query_plans():
+    for collection, query in hot_path_queries():
+        winning_plan = collection.find(query).explain()["queryPlanner"]["winningPlan"]
+        if "COLLSCAN" in plan_stages(winning_plan):
+            raise RuntimeError(f"Query {query} on {collection.name} falls back to a COLLSCAN; run ensure_indexes()")
+
+
+def compact_nft_metadata(result: dict) -> dict:
+    # The fields show_nft_data reads from a getAsset result, flattened; traits become a trait_type -> value map
+    content = result.get('content') or {}
+    metadata = content.get('metadata') or {}
+    links = content.get('links') or {}
+    grouping = result.get('grouping') or [{}]
+    compact = {
+        'id': result.get('id'),
+        'name': metadata.get('name'),
+        'symbol': metadata.get('symbol'),
+        'description': metadata.get('description'),
+        'image': links.get('image'),
+        'traits': {attr['trait_type']: attr.get('value') for attr in metadata.get('attributes') or []
+                   if isinstance(attr, dict) and attr.get('trait_type') is not None},
+        'collection_address': grouping[0].get('group_value'),
+        'website': links.get('external_url'),
+        'creators': result.get('creators'),
+        'royalty': result.get('royalty'),
+        'supply': result.get('supply'),
+        'burnt': result.get('burnt'),
+        'interface': result.get('interface'),
+        'mutable': result.get('mutable'),
+    }
+    return {key: value for key, value in compact.items() if value is not None}
+
+
+def nft_blob_document(result: dict) -> Optional[Dict]:
+    values = {'files': (result.get('content') or {}).get('files'), 'authorities': result.get('authorities')}
+    blobs = {field: values[field] for field in NFT_BLOB_FIELDS if values[field]}
+    if not blobs:
+        return None
+    return {'id': result['id'], 'blob': Binary(zlib.compress(json.dumps(blobs).encode()))}
+
+
+def nft_metadata_document(result: dict, collection) -> dict:
+    # Normalized collection key, edition number and name are stored alongside the compact asset for indexed lookups
+    compact = compact_nft_metadata(result)
+    return {**compact, 'collection': collection, **lookup_keys(compact.get('name'))}
+
+
+def iter_bulk_batches(documents: list):
+    # Batches are cut by serialized size rather than count, since Helius metadata ranges from 1KB to several MB
+    batch, batch_bytes = [], 0
+    for doc in documents:
+        size = len(bson.encode(doc))
+        if size > MAX_DOCUMENT_BYTES:
+            print(f"Skipping {doc.get('id')}: {size} bytes exceeds the BSON document limit")
+            continue
+        if batch and (batch_bytes + size > MAX_BULK_BATCH_BYTES or len(batch) >= MAX_BULK_BATCH_DOCS):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(doc)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+def upsert_batch(collection, batch: list):
+    requests = [UpdateOne({"id": doc["id"]}, {"$set": doc}, upsert=True) for doc in batch]
+    try:
+        collection.bulk_write(requests, ordered=False)
+    except BulkWriteError as e:
+        # Two writers upserting the same new mint race on the unique id index; the loser's write is redundant
+        if any(error["code"] != DUPLICATE_KEY_ERROR for error in e.details["writeErrors"]):
+            raise
+
+
+def upsert_documents(collection, documents: list, concurrency: int = 1):
+    # Idempotent: re-ingesting a collection refreshes existing mints instead of duplicating them
+    batches = iter_bulk_batches(documents)
+    if concurrency <= 1:
+        for batch in batches:
+            upsert_batch(collection, batch)
+        return
 
-        chunks = [results[i:i + 7000] for i in range(0, len(results), 7000)]
-        for chunk in chunks:
-            insert_requests = [InsertOne(doc) for doc in chunk]
-            nft_metadata_collection.bulk_write(insert_requests, ordered=False)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(upsert_batch, collection, batch) for batch in batches]:
+            future.result()
+
+
+def insert_nft_metadata(metadata, collection, concurrency: int = 1):
+    if isinstance(metadata, list):
+        results = [nft_metadata_document(doc['result'], collection) for doc in metadata]
+        upsert_documents(nft_metadata_collection, results, concurrency)
+        blobs = [blob for blob in (nft_blob_document(doc['result']) for doc in metadata) if blob]
+        upsert_documents(nft_blobs_collection, blobs, concurrency)
+        index_nft_traits(results, collection)
 
     else:
-        result = {**metadata['result'], 'collection': collection}
+        result = nft_metadata_document(metadata['result'], collection)
         mint_address = result["id"]
         nft_metadata_collection.update_one(
             {"id": mint_address},
             {"$set": result},
             upsert=True
         )
+        blob = nft_blob_document(metadata['result'])
+        if blob:
+            nft_blobs_collection.update_one({"id": mint_address}, {"$set": blob}, upsert=True)
+        index_nft_traits([result], collection)
+
+
+def get_nft_blobs(mint_address: str) -> dict:
+    doc = nft_blobs_collection.find_one({"id": mint_address}, {"_id": 0, "blob": 1})
+    if doc is None:
+        return {}
+    return json.loads(zlib.decompress(doc["blob"]))
+
+
+def iter_collection_nft_metadata(collection, batch_size: int = 1000):
+    # Compact documents of one collection in edition order, without the lookup keys
+    return nft_metadata_collection.find(
+        {"collection": collection}, {"_id": 0, "collection": 0, "collection_key": 0, "name_key": 0}
+    ).sort("edition", ASCENDING).batch_size(batch_size)
+
+
+def get_nft_blob_documents(mint_addresses: list) -> dict:
+    # Compressed blobs as stored, keyed by mint; callers that only move them around never decompress
+    return {doc["id"]: doc["blob"] for doc in nft_blobs_collection.find({"id": {"$in": mint_addresses}},
+                                                                        {"_id": 0, "id": 1, "blob": 1})}
+
+
+def restore_nft_metadata(documents: list, blobs: list, collection, concurrency: int = 1):
+    # documents are compact NFT documents without collection or lookup keys, e.g. read back from a snapshot
+    documents = [{**doc, 'collection': collection, **lookup_keys(doc.get('name'))} for doc in documents]
+    upsert_documents(nft_metadata_collection, documents, concurrency)
+    upsert_documents(nft_blobs_collection, blobs, concurrency)
+    index_nft_traits(documents, collection)
+
+
+def index_nft_traits(documents: list, collection):
+    # Incremental inverted index: adds each mint to its (trait_type, value) entries; re-indexing a mint is a no-op
+    mints_by_trait = {}
+    for doc in documents:
+        for trait_type, value in (doc.get("traits") or {}).items():
+            mints_by_trait.setdefault((trait_type, json.dumps(value, sort_keys=True)), (value, []))[1].append(doc["id"])
+    if not mints_by_trait:
+        return
+
+    update_requests = [
+        UpdateOne(
+            {"collection": collection, "trait_type": trait_type, "value": value},
+            [{"$set": {"mints": {"$setUnion": [{"$ifNull": ["$mints", []]}, mints]}}},
+             {"$set": {"count": {"$size": "$mints"}}}],
+            upsert=True
+        )
+        for (trait_type, _), (value, mints) in mints_by_trait.items()
+    ]
+    try:
+        trait_index_collection.bulk_write(update_requests, ordered=False)
+    except BulkWriteError as e:
+        # Concurrent writers can race to create the same entry; the losing upsert's mints land on the next batch
+        if any(error["code"] != DUPLICATE_KEY_ERROR for error in e.details["writeErrors"]):
+            raise
+
+
+def rebuild_trait_index(collection):
+    # Full rebuild from nft_metadata; drops mints whose traits changed since they were first indexed.
+    # Entries are replaced in place and stale ones removed afterwards, so readers never see an empty index.
+    rebuilt_at = datetime.now()
+    nft_metadata_collection.aggregate([
+        {"$match": {"collection": collection}},
+        {"$project": {"_id": 0, "id": 1, "traits": {"$objectToArray": {"$ifNull": ["$traits", {}]}}}},
+        {"$unwind": "$traits"},
+        {"$group": {"_id": {"trait_type": "$traits.k", "value": "$traits.v"}, "mints": {"$addToSet": "$id"}}},
+        {"$project": {"_id": 0, "collection": {"$literal": collection}, "trait_type": "$_id.trait_type",
+                      "value": "$_id.value", "mints": 1, "count": {"$size": "$mints"},
+                      "rebuilt_at": {"$literal": rebuilt_at}}},
+        {"$merge": {"into": trait_index_collection.name, "on": ["collection", "trait_type", "value"],
+                    "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ])
+    if not trait_index_collection.find_one({"collection": collection, "rebuilt_at": rebuilt_at}, {"_id": 1}):
+        # No NFT has traits: a marker entry records that the index is built, so the collection isn't rebuilt
+        # on every backfill and trait searches report no matches rather than a missing index
+        trait_index_collection.update_one(
+            {"collection": collection, "trait_type": None, "value": None},
+            {"$set": {"mints": [], "count": 0, "rebuilt_at": rebuilt_at}},
+            upsert=True
+        )
+    trait_index_collection.delete_many({"collection": collection, "rebuilt_at": {"$not": {"$gte": rebuilt_at}}})
+
+
+def update_collection_rarity(collection):
+    # Statistical rarity: an NFT scores sum(total / count) over its traits, ranked within the collection.
+    # Runs server-side against the trait index and merges rarity_score / rarity_rank back into nft_metadata.
+    total = nft_metadata_collection.count_documents({"collection": collection})
+    if not total:
+        return
+    pipeline = [
+        {"$match": {"collection": collection}},
+        {"$project": {"_id": 0, "id": 1, "traits": {"$objectToArray": {"$ifNull": ["$traits", {}]}}}},
+        {"$unwind": "$traits"},
+        {"$lookup": {
+            "from": trait_index_collection.name,
+            "let": {"trait_type": "$traits.k", "value": "$traits.v"},
+            "pipeline": [
+                {"$match": {"$expr": {"$and": [{"$eq": ["$collection", collection]},
+                                               {"$eq": ["$trait_type", "$$trait_type"]},
+                                               {"$eq": ["$value", "$$value"]}]}}},
+                {"$project": {"_id": 0, "count": 1}},
+            ],
+            "as": "trait",
+        }},
+        {"$group": {"_id": "$id", "rarity_score": {
+            "$sum": {"$divide": [total, {"$max": [1, {"$ifNull": [{"$first": "$trait.count"}, 1]}]}]}}}},
+        {"$setWindowFields": {"sortBy": {"rarity_score": -1}, "output": {"rarity_rank": {"$rank": {}}}}},
+        {"$project": {"_id": 0, "id": "$_id", "rarity_score": 1, "rarity_rank": 1}},
+    ]
+    if has_unique_index(nft_metadata_collection, "id"):
+        nft_metadata_collection.aggregate(pipeline + [
+            {"$merge": {"into": nft_metadata_collection.name, "on": "id", "whenMatched": "merge",
+                        "whenNotMatched": "discard"}},
+        ])
+        return
+
+    # $merge on id needs a unique index; until ensure_indexes gets one, scores are written back from here
+    update_requests = []
+    for doc in nft_metadata_collection.aggregate(pipeline, allowDiskUse=True):
+        update_requests.append(UpdateMany({"id": doc["id"]}, {"$set": {"rarity_score": doc["rarity_score"],
+                                                                       "rarity_rank": doc["rarity_rank"]}}))
+        if len(update_requests) == 1000:
+            nft_metadata_collection.bulk_write(update_requests, ordered=False)
+            update_requests = []
+    if update_requests:
+        nft_metadata_collection.bulk_write(update_requests, ordered=False)
+
+
+def has_trait_index(collection) -> bool:
+    return trait_index_collection.find_one({"collection": collection}, {"_id": 1}) is not None
+
+
+def get_collections_without_trait_index() -> list:
+    # Collections with stored NFTs but no index entries, e.g. ingested before the trait index existed
+    indexed = set(trait_index_collection.distinct("collection"))
+    return [(doc["_id"], doc["collectionName"])
+            for doc in collection_info_collection.find({}, {"collectionName": 1})
+            if doc["_id"] not in indexed and nft_metadata_collection.find_one({"collection": doc["_id"]}, {"_id": 1})]
+
+
+def get_trait_frequencies(collection, traits: dict) -> dict:
+    # Share of the collection holding each of the given traits, e.g. {"Eyes": 0.031}
+    if not traits:
+        return {}
+    total = nft_metadata_collection.count_documents({"collection": collection})
+    entries = trait_index_collection.find(
+        {"collection": collection, "$or": [{"trait_type": trait_type, "value": value}
+                                           for trait_type, value in traits.items()]},
+        {"_id": 0, "trait_type": 1, "count": 1}
+    )
+    return {entry["trait_type"]: entry["count"] / total for entry in entries} if total else {}
+
+
+def find_nfts_by_traits(collection, traits: dict, limit: int = 50) -> list:
+    # Intersects the index entries for each requested trait, then fetches only the matching NFTs
+    if not traits:
+        return []
+    entries = list(trait_index_collection.find(
+        {"collection": collection, "$or": [{"trait_type": trait_type, "value": value}
+                                           for trait_type, value in traits.items()]},
+        {"_id": 0, "trait_type": 1, "mints": 1}
+    ))
+    if len({entry["trait_type"] for entry in entries}) < len(traits):
+        return []
+    mints = set.intersection(*(set(entry["mints"]) for entry in entries))
+    return list(nft_metadata_collection.find({"id": {"$in": list(mints)}}, NFT_METADATA_PROJECTION)
+                .sort("rarity_rank", ASCENDING).limit(limit))
+
+
+def insert_stats_points(points: list):
+    if points:
+        collection_stats_collection.insert_many(points, ordered=False)
+
+
+def claim_stats_job(job: str, interval: timedelta) -> bool:
+    # One collector across processes: whoever moves next_run_at forward runs this round
+    now = datetime.now()
+    try:
+        stats_jobs_collection.update_one(
+            {"_id": job, "next_run_at": {"$lte": now}},
+            {"$set": {"next_run_at": now + interval, "claimed_at": now}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+def get_stats_watermark(tier: str) -> Optional[datetime]:
+    # Everything before the watermark has been rolled up into this tier
+    job = stats_jobs_collection.find_one({"_id": f"rollup.{tier}"})
+    return job["through"] if job else None
+
+
+def rollup_collection_stats(source: str, target: str, end: datetime) -> int:
+    # Averages source points into target buckets (weighted by the samples behind each point), plus the floor range
+    source_collection = STATS_TIERS[source][0]
+    target_collection, unit, _ = STATS_TIERS[target]
+    start = get_stats_watermark(target)
+    if start is None:
+        first = source_collection.find_one({}, {"ts": 1}, sort=[("ts", ASCENDING)])
+        if first is None:
+            return 0
+        start = first["ts"]
+    if start >= end:
+        return 0
+
+    weight = {"$ifNull": ["$samples", 1]}
+    group = {"_id": {"meta": "$meta", "ts": {"$dateTrunc": {"date": "$ts", "unit": unit}}},
+             "name": {"$last": "$name"}, "samples": {"$sum": weight},
+             "floorPrice_min": {"$min": {"$ifNull": ["$floorPrice_min", "$floorPrice"]}},
+             "floorPrice_max": {"$max": {"$ifNull": ["$floorPrice_max", "$floorPrice"]}}}
+    for metric in STATS_METRICS:
+        group[f"{metric}_sum"] = {"$sum": {"$cond": [{"$isNumber": f"${metric}"}, {"$multiply": [f"${metric}", weight]}, 0]}}
+        group[f"{metric}_weight"] = {"$sum": {"$cond": [{"$isNumber": f"${metric}"}, weight, 0]}}
+    buckets = source_collection.aggregate([
+        {"$match": {"ts": {"$gte": start, "$lt": end}}},
+        {"$sort": {"ts": ASCENDING}},
+        {"$group": group},
+    ])
+
+    points = []
+    for bucket in buckets:
+        point = {"ts": bucket["_id"]["ts"], "meta": bucket["_id"]["meta"], "name": bucket["name"],
+                 "samples": bucket["samples"], "floorPrice_min": bucket["floorPrice_min"],
+                 "floorPrice_max": bucket["floorPrice_max"]}
+        for metric in STATS_METRICS:
+            if bucket[f"{metric}_weight"]:
+                point[metric] = bucket[f"{metric}_sum"] / bucket[f"{metric}_weight"]
+        points.append({k: v for k, v in point.items() if v is not None})
+    if points:
+        target_collection.insert_many(points, ordered=False)
+    stats_jobs_collection.update_one({"_id": f"rollup.{target}"}, {"$set": {"through": end}}, upsert=True)
+    return len(points)
+
+
+def get_stats_points(tier: str, collection_key: str, metric: str, start: datetime, end: datetime) -> list:
+    return list(STATS_TIERS[tier][0].find(
+        {"meta.collection": collection_key, "ts": {"$gte": start, "$lt": end}, metric: {"$exists": True}},
+        {"_id": 0, "ts": 1, "meta.source": 1, metric: 1, "floorPrice_min": 1, "floorPrice_max": 1},
+        sort=[("ts", ASCENDING)]
+    ))
+
+
+def has_stats_points(collection_key: str) -> bool:
+    return any(collection.find_one({"meta.collection": collection_key}, {"_id": 1})
+               for collection, _, _ in STATS_TIERS.values())
 
 
 def insert_collection_info(collection_name, collectionId):
@@ -57,23 +558,258 @@ def insert_failed_chunks(chunk, chunk_number, helloMoonCollectionId, collectionN
         'collectionName': collectionName
     }
 
-    failed_chunks_collection.insert_one(data)
+    failed_chunks_collection.update_one(
+        {'helloMoonCollectionId': helloMoonCollectionId, 'chunk_number': chunk_number},
+        {'$set': data, '$setOnInsert': {'attempts': 0}},
+        upsert=True
+    )
+
+
+def claim_failed_chunk(lease: timedelta) -> Optional[Dict]:
+    # Hides the claimed chunk from other workers until the lease runs out
+    now = datetime.now()
+    return failed_chunks_collection.find_one_and_update(
+        {"$or": [{"next_retry_at": {"$lte": now}}, {"next_retry_at": {"$exists": False}}]},
+        {"$set": {"next_retry_at": now + lease}, "$inc": {"attempts": 1}},
+        sort=[("timestamp", ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def reschedule_failed_chunk(failed_chunk_id, retry_at: datetime):
+    failed_chunks_collection.update_one({"_id": failed_chunk_id}, {"$set": {"next_retry_at": retry_at}})
+
+
+def delete_failed_chunk(failed_chunk_id):
+    failed_chunks_collection.delete_one({"_id": failed_chunk_id})
+
+
+def claim_ingestion_checkpoint(collectionId: str, collection_name: str, collection_info_id, stale_after: timedelta) -> Optional[Dict]:
+    # Single-flight across processes: only matches when nobody holds a fresh "running" checkpoint.
+    # Otherwise the upsert collides with the unique index and the claim is refused.
+    now = datetime.now()
+    try:
+        return ingestion_checkpoints_collection.find_one_and_update(
+            {"helloMoonCollectionId": collectionId,
+             "$or": [{"status": {"$ne": "running"}}, {"updated_at": {"$lt": now - stale_after}}]},
+            {"$set": {"collectionName": collection_name, "collection_info_id": collection_info_id,
+                      "status": "running", "updated_at": now},
+             "$setOnInsert": {"chunks_written": [], "chunks_failed": [], "pages_fetched": 0}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        return None
+
+
+def get_ingestion_checkpoint(collectionId: str) -> Optional[Dict]:
+    return ingestion_checkpoints_collection.find_one({"helloMoonCollectionId": collectionId})
+
+
+def update_ingestion_checkpoint(collectionId: str, **fields):
+    ingestion_checkpoints_collection.update_one(
+        {"helloMoonCollectionId": collectionId},
+        {"$set": {**fields, "updated_at": datetime.now()}}
+    )
+
+
+def mark_chunk_written(collectionId: str, chunk_number: int):
+    ingestion_checkpoints_collection.update_one(
+        {"helloMoonCollectionId": collectionId},
+        {"$addToSet": {"chunks_written": chunk_number}, "$pull": {"chunks_failed": chunk_number},
+         "$set": {"updated_at": datetime.now()}}
+    )
+
+
+def mark_chunk_failed(collectionId: str, chunk_number: int):
+    ingestion_checkpoints_collection.update_one(
+        {"helloMoonCollectionId": collectionId},
+        {"$addToSet": {"chunks_failed": chunk_number}, "$set": {"updated_at": datetime.now()}}
+    )
+
+
+def complete_partial_ingestion(collectionId: str) -> bool:
+    result = ingestion_checkpoints_collection.update_one(
+        {"helloMoonCollectionId": collectionId, "status": "partial", "chunks_failed": {"$size": 0}},
+        {"$set": {"status": "complete", "updated_at": datetime.now()}}
+    )
+    return result.modified_count > 0
 
 
 def collection_info_exists(collectionId: str) -> bool:
     return bool(collection_info_collection.find_one({"helloMoonCollectionId": collectionId}))
 
 
-def get_nft_metadata_from_mongodb(nft_name: str) -> Optional[Dict]:
-    nft_document = nft_metadata_collection.find_one({"content.metadata.name": nft_name})
+def get_collection_info(collectionId: str) -> Optional[Dict]:
+    return collection_info_collection.find_one({"helloMoonCollectionId": collectionId})
+
+
+def get_collection_alias(alias: str) -> Optional[Dict]:
+    return collection_aliases_collection.find_one({"alias": alias})
+
+
+def insert_collection_alias(alias: str, collectionId: str, collection_name: str):
+    collection_aliases_collection.update_one(
+        {"alias": alias},
+        {"$set": {"helloMoonCollectionId": collectionId, "collectionName": collection_name},
+         "$setOnInsert": {"timestamp": datetime.now()}},
+        upsert=True
+    )
+
+
+def get_known_collections() -> list:
+    known = {doc["helloMoonCollectionId"]: doc["collectionName"]
+             for doc in collection_aliases_collection.find({}, {"helloMoonCollectionId": 1, "collectionName": 1})}
+    known.update({doc["helloMoonCollectionId"]: doc["collectionName"]
+                  for doc in collection_info_collection.find({}, {"helloMoonCollectionId": 1, "collectionName": 1})})
+    return list(known.items())
+
+
+def get_llm_cache_entry(key: str) -> Optional[Dict]:
+    return llm_cache_collection.find_one_and_update(
+        {"key": key},
+        {"$set": {"last_hit_at": datetime.now()}, "$inc": {"hits": 1}}
+    )
+
+
+def insert_llm_cache_entry(key: str, response, latency: float):
+    now = datetime.now()
+    llm_cache_collection.update_one(
+        {"key": key},
+        {"$set": {"response": response, "latency": latency, "created_at": now, "last_hit_at": now, "hits": 0}},
+        upsert=True
+    )
+
+
+def trim_llm_cache(max_entries: int):
+    # Evict least recently hit entries once the cache grows past max_entries
+    excess = llm_cache_collection.estimated_document_count() - max_entries
+    if excess > 0:
+        stale_ids = [doc["_id"] for doc in llm_cache_collection.find({}, {"_id": 1}).sort("last_hit_at", ASCENDING).limit(excess)]
+        llm_cache_collection.delete_many({"_id": {"$in": stale_ids}})
+
+
+def get_wallet_snapshot_page(owner: str, skip: int, limit: int) -> Optional[Dict]:
+    return wallet_snapshots_collection.find_one(
+        {"owner": owner},
+        {"assets": {"$slice": [skip, limit]}, "asset_count": 1, "fetched_at": 1, "truncated": 1}
+    )
+
+
+def update_wallet_snapshot(owner: str, assets: list, truncated: bool = False):
+    # Applies only the difference against the stored snapshot: removed mints are pulled,
+    # changed ones are set in place and new ones are appended
+    existing = wallet_snapshots_collection.find_one({"owner": owner}, {"assets": 1})
+    now = datetime.now()
+    if existing is None:
+        wallet_snapshots_collection.update_one(
+            {"owner": owner},
+            {"$set": {"assets": assets, "asset_count": len(assets), "fetched_at": now, "truncated": truncated}},
+            upsert=True
+        )
+        return
+
+    stored = {asset["mint_address"]: asset for asset in existing.get("assets", [])}
+    fresh = {asset["mint_address"]: asset for asset in assets}
+    removed = [mint for mint in stored if mint not in fresh]
+    added = [asset for asset in assets if asset["mint_address"] not in stored]
+    changed = [asset for asset in assets if asset["mint_address"] in stored and stored[asset["mint_address"]] != asset]
+
+    update_requests = []
+    if removed:
+        update_requests.append(UpdateOne({"owner": owner}, {"$pull": {"assets": {"mint_address": {"$in": removed}}}}))
+    for asset in changed:
+        update_requests.append(UpdateOne(
+            {"owner": owner},
+            {"$set": {"assets.$[asset]": asset}},
+            array_filters=[{"asset.mint_address": asset["mint_address"]}]
+        ))
+    if added:
+        update_requests.append(UpdateOne({"owner": owner}, {"$push": {"assets": {"$each": added}}}))
+    update_requests.append(UpdateOne({"owner": owner}, {"$set": {"asset_count": len(assets), "fetched_at": now,
+                                                                "truncated": truncated}}))
+
+    wallet_snapshots_collection.bulk_write(update_requests, ordered=True)
+    if len(update_requests) > 1:
+        print(f"Wallet snapshot {owner}: {len(added)} added, {len(removed)} removed, {len(changed)} changed")
+
+
+def get_nft_metadata_from_mongodb(nft_name: str, collection) -> Optional[Dict]:
+    query = {"collection": collection, "name": nft_name}
+    nft_document = nft_metadata_collection.find_one(query, NFT_METADATA_PROJECTION)
+    if nft_document is None and compact_legacy_collection(collection):
+        nft_document = nft_metadata_collection.find_one(query, NFT_METADATA_PROJECTION)
 
     if nft_document:
         return nft_document
     return None
 
 
+def get_nft_metadata_by_edition(collection, edition: int) -> Optional[Dict]:
+    query = {"collection": collection, "edition": edition}
+    nft_document = nft_metadata_collection.find_one(query, NFT_METADATA_PROJECTION)
+    if nft_document is None and compact_legacy_collection(collection):
+        nft_document = nft_metadata_collection.find_one(query, NFT_METADATA_PROJECTION)
+    return nft_document
+
+
+def get_nft_metadata_by_collection_key(collection_key: str, edition: int) -> Optional[Dict]:
+    return nft_metadata_collection.find_one({"collection_key": collection_key, "edition": edition},
+                                            NFT_METADATA_PROJECTION)
+
+
+def find_closest_nft_metadata(nft_name: str, collection) -> Optional[Dict]:
+    # Local fuzzy fallback over the names already stored for this collection; never calls upstream
+    names = {
+        normalize_name(doc["name"]): doc["_id"]
+        for doc in nft_metadata_collection.find({"collection": collection, "name": {"$exists": True}}, {"name": 1})
+    }
+    matches = difflib.get_close_matches(normalize_name(nft_name), names, n=1, cutoff=0.8)
+    if matches:
+        return nft_metadata_collection.find_one({"_id": names[matches[0]]}, NFT_METADATA_PROJECTION)
+    return None
+
+
+def compact_legacy_collection(collection) -> bool:
+    # Legacy raw documents have no top-level name or edition, so a lookup that misses compacts the collection
+    # first instead of waiting for the background pass to reach it; True if anything was compacted
+    if collection in _compacted_collections:
+        return False
+    compacted = compact_legacy_nft_metadata(collection)
+    _compacted_collections.add(collection)
+    return compacted > 0
+
+
+def compact_legacy_nft_metadata(collection=None) -> int:
+    # Rewrites documents stored as raw getAsset results into the compact schema, moving blobs to nft_blobs
+    query = {"content": {"$exists": True}}
+    if collection is not None:
+        query["collection"] = collection
+    cursor = nft_metadata_collection.find(query)
+    replace_requests = []
+    blobs = []
+    compacted = 0
+    for doc in cursor:
+        replace_requests.append(ReplaceOne({"_id": doc["_id"]}, nft_metadata_document(doc, doc.get("collection"))))
+        blob = nft_blob_document(doc)
+        if blob:
+            blobs.append(blob)
+        if len(replace_requests) == 1000:
+            upsert_documents(nft_blobs_collection, blobs)
+            nft_metadata_collection.bulk_write(replace_requests, ordered=False)
+            compacted += len(replace_requests)
+            replace_requests, blobs = [], []
+    if replace_requests:
+        upsert_documents(nft_blobs_collection, blobs)
+        nft_metadata_collection.bulk_write(replace_requests, ordered=False)
+        compacted += len(replace_requests)
+    if compacted:
+        print(f"Compacted {compacted} legacy NFT metadata documents")
+    return compacted
+
+
 def get_nft_metadata_from_mongodb_by_address(address: str) -> Optional[Dict]:
-    nft_document = nft_metadata_collection.find_one({"id": address})
+    nft_document = nft_metadata_collection.find_one({"id": address}, NFT_METADATA_PROJECTION)
 
     if nft_document:
         return nft_document
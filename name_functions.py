@@ -0,0 +1,26 @@
+import re
+from typing import Optional
+
+EDITION_PATTERN = re.compile(r"#\s*(\d+)")
+
+
+def normalize_name(name: str) -> str:
+    # Lowercase, drop punctuation and collapse whitespace so "Mad  Lads" and "mad-lads" share a key
+    return " ".join(re.sub(r"[^0-9a-z#]+", " ", (name or "").lower()).split())
+
+
+def parse_edition(name: str) -> Optional[int]:
+    matches = EDITION_PATTERN.findall(name or "")
+    return int(matches[-1]) if matches else None
+
+
+def collection_key(name: str) -> str:
+    return normalize_name((name or "").split('#')[0])
+
+
+def lookup_keys(name: str) -> dict:
+    return {
+        "collection_key": collection_key(name),
+        "edition": parse_edition(name),
+        "name_key": normalize_name(name)
+    }
@@ -0,0 +1,140 @@
+# Static sidebar and roadmap copy. Rendered to markdown once at import so Streamlit reruns only emit it.
+
+SIDEBAR_FEATURES = [
+    {
+        "title": "1. NFTs in Your Wallet",
+        "summary": "🔍 Query the NFTs present in your Solana wallet.",
+        "example": "'Show me the NFTs in my wallet: [Your Wallet Address]'",
+    },
+    {
+        "title": "2. NFT Details by Mint Address",
+        "summary": "🖼 Get detailed information of a specific NFT using its mint address.",
+        "example": "'Tell me about the NFT with mint address: [Mint Address]'",
+        "caption": "You can ask it to query only specific properties of the NFT as well.",
+    },
+    {
+        "title": "3. NFT Details by Name",
+        "summary": "🏷 Query details of an NFT by its name.",
+        "example": "'Tell me about the NFT named: [NFT Name]'",
+        "caption": "You can ask it to query only specific properties of the NFT as well.",
+    },
+    {
+        "title": "4. NFT Collection Stats",
+        "summary": "📊 Fetch statistics of a specific NFT collection.",
+        "example": "'Show me the stats for the [Collection Name] collection'",
+        "caption": "You can ask it to query only specific properties of the collection as well.",
+    },
+    {
+        "title": "5. Popular NFT Collections",
+        "summary": "🌟 Discover popular NFT collections for a specified time range.",
+        "example": "'Show me the popular collections for the last 7 days'",
+        "caption": "You can specify the number of top collections (1-50) and time range (1h, 1d, 7d, 30d) to fetch.",
+    },
+    {
+        "title": "6. Collection Trends",
+        "summary": "📈 Chart how a collection's stats have moved over time.",
+        "example": "'Show me the floor price history for [Collection Name] over the last 30 days'",
+        "caption": "Floor price, volume, listings, holders, market cap and average price are tracked.",
+    },
+]
+
+ROADMAP_FEATURES = [
+    # Existing Features
+    {
+        "title": "🔍 View Your NFTs",
+        "description": "Simply input your Solana wallet address and see all the NFTs you own.",
+        "stage": "Launched",
+    },
+    {
+        "title": "🔖 Details by Mint Address",
+        "description": "Want to know more about an NFT? Just provide its mint address. You can also ask specific questions or request particular details.",
+        "stage": "Launched",
+    },
+    {
+        "title": "📛 Details by NFT Name",
+        "description": "Search for an NFT using its name. Ask specific questions or request only the details you're interested in.",
+        "stage": "Launched",
+    },
+    {
+        "title": "📊 Collection Stats",
+        "description": "Get insights on any NFT collection. Ask about specific stats or pose a question about the collection.",
+        "stage": "Launched",
+    },
+    {
+        "title": "🌟 Popular Collections",
+        "description": "Discover the trending NFT collections. Choose from time ranges of 1 hour, 1 day, 7 days, or 30 days, and select your desired number of top collections (from 1 to 50).",
+        "stage": "Launched",
+    },
+    # Upcoming Features
+    {
+        "title": "📝 List NFT on Vtopia",
+        "description": "List NFT by its name on Vtopia",
+        "stage": "Development",
+    },
+    {
+        "title": "🛍️ Buy NFT from Vtopia",
+        "description": "You can buy NFT just by its name",
+        "stage": "Development",
+    },
+    {
+        "title": "🔥 Bulk Actions",
+        "description": "Buy/List Multiple NFT from Vtopia in single prompt",
+        "stage": "Development",
+    },
+    {
+        "title": "💼 Make collection offer",
+        "description": "You can make collection offers with global traits on Vtopia by collection name",
+        "stage": "Development",
+    },
+    {
+        "title": "🤝 Make/Accept Offer",
+        "description": "Make or accept offers for NFTs on Vtopia",
+        "stage": "Development",
+    }
+]
+
+STAGE_COLORS = {
+    "Launched": "rgba(76, 175, 80, 0.5)",  # Greenish
+    "Development": "rgba(255, 193, 7, 0.5)"  # Yellowish
+}
+
+
+def _get_stage_tag(stage):
+    color = STAGE_COLORS.get(stage, "rgba(206, 205, 202, 0.5)")
+    return (
+        f'<span style="background-color: {color}; padding: 1px 6px; '
+        "margin: 0 5px; display: inline; vertical-align: middle; "
+        f"border-radius: 0.25rem; font-size: 0.75rem; font-weight: 400; "
+        f'white-space: nowrap">{stage}'
+        "</span>"
+    )
+
+
+def _sidebar_markdown():
+    sections = ["Welcome to **Vtopia SeraAI**! Here's a quick guide on how to interact with the available features:"]
+    for feature in SIDEBAR_FEATURES:
+        section = f"### {feature['title']}\n\n{feature['summary']}\n\n**Example:**\n\n```\n{feature['example']}\n```"
+        if "caption" in feature:
+            section += f"\n\n<p style='font-size: 14px; color: gray;'>{feature['caption']}</p>"
+        sections.append(section)
+    sections.append("---\n\nFor more details, visit our [official website](https://vtopia.io).")
+    return "\n\n".join(sections)
+
+
+def _roadmap_section(heading, features):
+    lines = [f"## {heading}", "<br>"]
+    for feature in features:
+        lines.append(f"#### {feature['title']} {_get_stage_tag(feature['stage'])}")
+        lines.append(f"<div style='padding-left: 38px; margin-bottom: 15px;'><span style='color: gray;'>{feature['description']}</span></div>")
+    return "\n\n".join(lines)
+
+
+def _roadmap_markdown():
+    launched = [feature for feature in ROADMAP_FEATURES if feature["stage"] == "Launched"]
+    upcoming = [feature for feature in ROADMAP_FEATURES if feature["stage"] != "Launched"]
+    return "\n\n---\n\n".join([_roadmap_section("🚀 September 2023", launched),
+                                 _roadmap_section("🛠️ October 2023", upcoming)])
+
+
+SIDEBAR_MARKDOWN = _sidebar_markdown()
+ROADMAP_MARKDOWN = _roadmap_markdown()
@@ -0,0 +1,166 @@
+import re
+from typing import Optional
+
+# Phrases users type for each field of the show_nft_data dict
+NFT_FIELD_SYNONYMS = {
+    "mint_address": ["mint_address"],
+    "symbol": ["symbol", "ticker"],
+    "description": ["description", "desc", "lore", "story"],
+    "image": ["image", "picture", "pic", "photo", "img", "pfp"],
+    "traits": ["traits", "trait", "attributes", "attribute", "properties"],
+    "collection": ["collection address", "collection id", "collection mint"],
+    "website": ["website", "url", "site", "link", "external url"],
+    "files": ["files", "file"],
+    "creators": ["creators", "creator", "artist", "artists"],
+    "royalty": ["royalty", "royalties", "seller fee"],
+    "authorities": ["authorities", "authority", "update authority"],
+    "supply": ["supply", "edition supply"],
+    "burnt": ["burnt", "burned", "burn"],
+    "interface": ["interface", "standard", "token standard"],
+    "mutable": ["mutable", "immutable", "mutability"],
+    "rarity": ["rarity", "rare", "rarest", "rank", "ranking", "rarity score"],
+}
+
+# Phrases users type for each top-level field of fetch_collection_stats
+STATS_FIELD_SYNONYMS = {
+    "description": ["description", "desc"],
+    "image": ["image", "picture", "pic", "logo"],
+    "website": ["website", "url", "site", "link"],
+    "slug": ["slug"],
+    "mint_price_mode": ["mint price", "mint price mode"],
+    "listing_count": ["listing count", "listings", "listed", "number listed"],
+    "supply": ["supply", "total supply", "items"],
+    "floorPrice": ["floor price", "floor"],
+    "current_owner_count": ["owner count", "owners", "holders", "holder count", "unique holders"],
+    "market_cap_usd": ["market cap usd", "market cap in usd", "usd market cap", "market cap"],
+    "market_cap_sol": ["market cap sol", "market cap in sol", "sol market cap", "market cap"],
+    "avg_price_sol": ["average price", "avg price", "average price sol", "avg price sol"],
+    "avg_price_usd": ["average price usd", "avg price usd"],
+    "owners_avg_usdc_holdings": ["usdc holdings", "owner holdings", "owners holdings"],
+    "magic_eden_holding": ["magic eden holding", "magic eden holdings", "me holding"],
+    "magic_eden_holding_proportion": ["magic eden proportion", "magic eden holding proportion", "me proportion"],
+    "average_wash_score": ["wash score", "wash trading", "wash"],
+}
+
+# Granularity buckets produced by fetch_collection_stats and the phrases that select them
+GRANULARITY_SYNONYMS = {
+    "thirty_min": ["30 min", "30 mins", "30 minutes", "30min", "30m", "thirty minutes", "half hour", "half an hour"],
+    "one_hour": ["1 hour", "1h", "1hr", "one hour", "hourly", "last hour", "past hour"],
+    "six_hour": ["6 hours", "6 hour", "6h", "six hours", "six hour"],
+    "half_day": ["12 hours", "12 hour", "12h", "half day", "twelve hours"],
+    "one_day": ["24 hours", "24h", "1 day", "1d", "one day", "daily", "today", "day"],
+    "one_week": ["7 days", "7d", "1 week", "one week", "weekly", "week"],
+    "one_month": ["30 days", "30d", "1 month", "one month", "monthly", "month"],
+}
+
+GRANULARITY_FIELD_SYNONYMS = {
+    "volume": ["volume", "vol"],
+    "price_percent_change": ["price change", "price percent change", "price movement"],
+    "volume_percent_change": ["volume change", "volume percent change"],
+    "avg_price_now": ["current average price", "avg price now", "average price now"],
+    "smart_inflow": ["smart inflow", "inflow"],
+    "smart_money_netflow_score": ["smart money", "netflow", "net flow", "smart money score"],
+    "buyers": ["buyers", "buyer count"],
+    "sellers": ["sellers", "seller count"],
+}
+
+ALL_FIELDS_PHRASES = ["all", "everything", "every property", "all properties", "all details", "full details"]
+# Words a structured lookup ("show me the royalty of X #12", "tell me about X") is made of besides field names.
+# Any other word left in the prompt makes it free-form, and it goes to the LLM.
+LOOKUP_FILLER_WORDS = {"show", "me", "tell", "about", "give", "get", "fetch", "display", "list", "see", "please",
+                       "what", "whats", "s", "is", "are", "the", "a", "an", "its", "it", "this", "that", "of", "for",
+                       "on", "in", "and", "with", "nft", "nfts", "collection", "collections", "details", "detail",
+                       "info", "information", "metadata", "stats", "statistics", "named", "called", "name", "mint",
+                       "address", "token", "i", "want", "to", "know", "can", "you", "just", "only", "current",
+                       "currently", "now", "value", "values", "data"}
+YES_NO_QUESTION = re.compile(r"^(is|are|was|were|does|do|did|can|could|should|would|will|has|have|why|how(?! (many|much)))\b")
+BASE58_ADDRESS = re.compile(r"\b[1-9A-HJ-NP-Za-km-z]{32,44}\b")
+
+
+def normalize_prompt(prompt: str) -> str:
+    return " " + " ".join(re.sub(r"[^0-9a-z#]+", " ", prompt.lower()).split()) + " "
+
+
+def mentions(text: str, phrases: list) -> bool:
+    return any(f" {phrase} " in text for phrase in phrases)
+
+
+def remove_phrase(text: str, phrase: str) -> str:
+    phrase = normalize_prompt(phrase).strip()
+    return text.replace(f" {phrase} ", " ") if phrase else text
+
+
+def matched_fields(text: str, synonyms: dict, data: dict) -> list:
+    return [field for field, phrases in synonyms.items() if field in data and mentions(text, phrases)]
+
+
+def project_nft_fields(text: str, nft_data: dict) -> dict:
+    projected = {field: nft_data[field] for field in matched_fields(text, NFT_FIELD_SYNONYMS, nft_data)}
+
+    traits = nft_data.get("traits") or {}
+    trait_matches = {trait: value for trait, value in traits.items()
+                     if trait and mentions(text, [normalize_prompt(str(trait)).strip()])}
+    if trait_matches and "traits" not in projected:
+        projected["traits"] = trait_matches
+
+    return projected
+
+
+def project_stats_fields(text: str, stats: dict) -> dict:
+    projected = {field: stats[field] for field in matched_fields(text, STATS_FIELD_SYNONYMS, stats)}
+
+    buckets = [bucket for bucket, phrases in GRANULARITY_SYNONYMS.items() if bucket in stats and mentions(text, phrases)]
+    bucket_fields = [field for field, phrases in GRANULARITY_FIELD_SYNONYMS.items() if mentions(text, phrases)]
+
+    if bucket_fields:
+        # "volume" alone spans every bucket; "24h volume" narrows it to one
+        for bucket in buckets or [bucket for bucket in GRANULARITY_SYNONYMS if bucket in stats]:
+            values = {field: stats[bucket][field] for field in bucket_fields if field in stats[bucket]}
+            if values:
+                projected[bucket] = values
+    else:
+        for bucket in buckets:
+            projected[bucket] = stats[bucket]
+
+    return projected
+
+
+def is_structured_lookup(text: str, data: dict) -> bool:
+    # True when every word is a field phrase, a trait, part of the NFT or collection name, or request filler
+    synonym_sets = [ALL_FIELDS_PHRASES]
+    if "collectionName" in data:
+        synonym_sets += list(STATS_FIELD_SYNONYMS.values()) + list(GRANULARITY_SYNONYMS.values())
+        synonym_sets += list(GRANULARITY_FIELD_SYNONYMS.values())
+    else:
+        synonym_sets += list(NFT_FIELD_SYNONYMS.values())
+        synonym_sets.append([normalize_prompt(str(trait)).strip() for trait in data.get("traits") or {}])
+    phrases = sorted({phrase for phrases in synonym_sets for phrase in phrases if phrase}, key=len, reverse=True)
+    for phrase in phrases:
+        if mentions(text, [phrase]):
+            text = remove_phrase(text, phrase)
+
+    name_words = set(normalize_prompt(" ".join(str(data.get(field) or "") for field in
+                                               ("name", "collectionName", "symbol", "slug"))).split())
+    return all(word in LOOKUP_FILLER_WORDS or word in name_words or re.fullmatch(r"#?\d+", word)
+               for word in text.split())
+
+
+def project_fields(prompt: str, data: dict) -> Optional[dict]:
+    # Deterministic answer for property lookups; None means the prompt needs the LLM
+    text = BASE58_ADDRESS.sub(" ", prompt)
+    text = normalize_prompt(text)
+    for name in (data.get("name"), data.get("collectionName")):
+        if name:
+            text = remove_phrase(text, name)
+
+    if YES_NO_QUESTION.match(text.strip()) or not is_structured_lookup(text, data):
+        return None
+
+    if "collectionName" in data:
+        projected = project_stats_fields(text, data)
+    else:
+        projected = project_nft_fields(text, data)
+
+    if projected and not mentions(text, ALL_FIELDS_PHRASES):
+        return projected
+    return data
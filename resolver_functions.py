@@ -0,0 +1,75 @@
+import threading
+import time
+from hellomoon_functions import get_hello_moon_collection_id
+from mongodb_functions import get_collection_alias, insert_collection_alias, get_known_collections
+from name_functions import normalize_name
+
+SIMILARITY_THRESHOLD = 0.7
+KNOWN_COLLECTIONS_TTL = 300
+
+_known_collections = {"loaded_at": 0, "entries": []}
+_known_collections_lock = threading.Lock()
+
+
+def trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def trigram_similarity(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def known_collections() -> list:
+    # (trigrams, helloMoonCollectionId, collectionName) for every collection we have seen, refreshed every few minutes
+    with _known_collections_lock:
+        if time.time() - _known_collections["loaded_at"] > KNOWN_COLLECTIONS_TTL:
+            _known_collections["entries"] = [
+                (trigrams(normalize_name(name)), collectionId, name) for collectionId, name in get_known_collections()
+            ]
+            _known_collections["loaded_at"] = time.time()
+        return _known_collections["entries"]
+
+
+def remember_collection(collectionId: str, collection_name: str):
+    with _known_collections_lock:
+        if all(known_id != collectionId for _, known_id, _ in _known_collections["entries"]):
+            _known_collections["entries"].append((trigrams(normalize_name(collection_name)), collectionId, collection_name))
+
+
+def match_known_collection(alias: str):
+    alias_trigrams = trigrams(alias)
+    best_score, best_match = 0.0, None
+    for collection_trigrams, collectionId, collection_name in known_collections():
+        score = trigram_similarity(alias_trigrams, collection_trigrams)
+        if score > best_score:
+            best_score, best_match = score, (collectionId, collection_name)
+    if best_score >= SIMILARITY_THRESHOLD:
+        return best_match
+    return None
+
+
+def resolve_collection(collection_name: str, save_alias: bool = True) -> tuple:
+    # Alias table, then in-process trigram match against known collections; HelloMoon only on a true miss.
+    # save_alias=False keeps a spelling we only guessed at (e.g. from the local router) out of the alias table.
+    alias = normalize_name(collection_name)
+    alias_doc = get_collection_alias(alias)
+    if alias_doc:
+        return alias_doc["helloMoonCollectionId"], alias_doc["collectionName"]
+
+    match = match_known_collection(alias)
+    if match is None:
+        match = get_hello_moon_collection_id(collection_name)
+        print(f"Resolved {collection_name} through HelloMoon: {match[1]}")
+    else:
+        print(f"Resolved {collection_name} locally: {match[1]}")
+
+    collectionId, retrieved_collection_name = match
+    if save_alias:
+        insert_collection_alias(alias, collectionId, retrieved_collection_name)
+    insert_collection_alias(normalize_name(retrieved_collection_name), collectionId, retrieved_collection_name)
+    remember_collection(collectionId, retrieved_collection_name)
+
+    return collectionId, retrieved_collection_name
@@ -0,0 +1,247 @@
+import math
+import re
+import threading
+from typing import Optional
+from mongodb_functions import get_nft_metadata_from_mongodb_by_address
+from tracing_functions import set_attributes, traced
+
+BASE58_ADDRESS = re.compile(r"\b[1-9A-HJ-NP-Za-km-z]{32,44}\b")
+NFT_EDITION = re.compile(r"#\s*\d+")
+# "m" is minutes here (5m, 30m candles); months need "mo" or the full word
+TIME_RANGE = re.compile(r"\b(\d+)\s*(m|mins?|minutes?|h|hrs?|hours?|d|days?|w|weeks?|mo|mos|months?)\b")
+TIME_UNIT_DAYS = {"min": 1 / 1440, "h": 1 / 24, "d": 1, "w": 7, "mo": 30}
+TOP_N = re.compile(r"\btop\s+(\d+)\b|\b(\d+)\s+(?:most\s+)?(?:popular|trending|hottest|top)\b")
+# Patterns match the whole query: an optional request phrase, the collection name and at most a trailing time window.
+# Anything else ("how has the volume of X changed") is left to the LLM.
+QUERY_PREFIX = r"^(?:(?:please\s+)?(?:show\s+me|get|give\s+me|fetch|plot|what\s+(?:is|are|was)|what's|whats)\s+)?(?:the\s+)?"
+QUERY_WINDOW = (r"(?:\s+(?:over|in|for|during)\s+(?:the\s+)?(?:last|past)\s+(?:\d+\s*)?"
+                r"(?:m|mins?|minutes?|h|hrs?|hours?|d|days?|w|weeks?|mo|mos|months?|years?))?\s*[?.!]*$")
+STATS_METRIC = r"(?:stats|statistics|floor(?:\s+price)?|volume|market\s*cap)"
+TREND_METRIC = r"(?:floor(?:\s+price)?|volume|listings?|owners|holders|market\s*cap|average\s+price|avg\s+price)"
+STATS_COLLECTION = [
+    re.compile(QUERY_PREFIX + STATS_METRIC + r"\s+(?:for|of|on)\s+(?:the\s+)?(.+?)(?:\s+collection)?\s*[?.!]*$",
+               re.IGNORECASE),
+    re.compile(QUERY_PREFIX + r"(.+?)\s+collection(?:'s)?\s+" + STATS_METRIC + r"\s*[?.!]*$", re.IGNORECASE),
+]
+TREND_COLLECTION = [
+    re.compile(QUERY_PREFIX + r"(?:" + TREND_METRIC + r"\s+)?(?:history|trend|chart|graph)\s+(?:for|of|on)\s+"
+               r"(?:the\s+)?(.+?)(?:\s+collection)?" + QUERY_WINDOW, re.IGNORECASE),
+    re.compile(QUERY_PREFIX + r"(.+?)(?:\s+collection)?(?:'s)?\s+" + TREND_METRIC + r"\s+(?:history|trend|chart|graph)"
+               + QUERY_WINDOW, re.IGNORECASE),
+]
+# A captured name containing one of these means the pattern misread the query, so it goes to the LLM instead
+NOT_COLLECTION_WORDS = {"and", "or", "vs", "versus", "compared", "compare", "changed", "change", "changing", "doing",
+                        "going", "performing", "moved", "moving", "been", "now", "today", "lately", "recently", "how",
+                        "why", "when", "has", "have", "did"}
+# Phrases selecting a stored stats metric for trend queries, checked in order
+TREND_METRIC_SYNONYMS = {
+    "volume_1d": ["volume"],
+    "listing_count": ["listing", "listed"],
+    "current_owner_count": ["owner", "holder"],
+    "market_cap_sol": ["market cap", "marketcap"],
+    "avg_price_sol": ["average price", "avg price"],
+    "floorPrice": ["floor"],
+}
+# Like the collection patterns, a name query must be the whole query: optional request phrase, "<name> #N", then
+# at most field words. "Are the eyes violet for X #12?" is a question about the NFT and goes to the LLM.
+NAME_FIELD = r"(?:details?|info|information|metadata|traits?|royalty|image|data)"
+NAME_QUERY = re.compile(
+    r"^(?:(?:please\s+)?(?:tell\s+me\s+about|show\s+me|give\s+me|get|fetch|find|look\s+up|what\s+(?:is|are)|"
+    r"what's|whats)\s+)?(?:the\s+)?(?:" + NAME_FIELD + r"\s+(?:for|of|on)\s+)?(?:(?:the|an?)\s+)?"
+    r"(?:nft\s+)?(?:(?:named|called)\s+)?[:'\"]?(.+?)['\"]?\s*(#\s*\d+)['\"]?"
+    r"(?:(?:'s)?\s+(?:nft\s+)?" + NAME_FIELD + r")?\s*[?.!]*$",
+    re.IGNORECASE,
+)
+# Words a real NFT name is unlikely to contain but a question about one does
+NOT_NAME_WORDS = NOT_COLLECTION_WORDS | {"for", "of", "is", "are", "was", "which", "what", "whats", "who", "where",
+                                         "many", "much", "does", "do", "in", "than", "rarest", "rare"}
+
+# Hand-tuned keyword weights acting as a tiny bag-of-words classifier
+INTENT_KEYWORDS = {
+    "get_nfts_by_owner": {"wallet": 3, "own": 2, "owns": 2, "owned": 2, "hold": 2, "holds": 2, "holding": 2,
+                          "holdings": 2, "portfolio": 2, "balance": 2, "my": 1, "owner": 2},
+    "get_nft_metadata_by_address": {"mint": 3, "token": 2, "metadata": 1, "nft": 1, "details": 1, "traits": 1,
+                                    "royalty": 1, "image": 1},
+    "get_nft_metadata_by_name": {"named": 2, "called": 2, "name": 1, "nft": 1, "traits": 1, "royalty": 1,
+                                 "image": 1},
+    "get_collection_stats": {"stats": 3, "statistics": 3, "floor": 2, "volume": 2, "market": 1, "cap": 1,
+                             "collection": 1, "listed": 1, "listings": 1, "supply": 1, "buyers": 1, "sellers": 1},
+    "get_popular_collections": {"popular": 3, "trending": 3, "hottest": 3, "top": 2, "collections": 1, "best": 1},
+    "get_collection_trend": {"history": 4, "historical": 4, "trend": 4, "chart": 4, "graph": 4, "plot": 3,
+                             "over": 1},
+}
+MIN_MARGIN = 2
+
+_stats = {"queries": 0, "routed": 0, "llm_calls": 0, "llm_seconds": 0.0}
+_stats_lock = threading.Lock()
+
+
+def score_intents(text: str) -> dict:
+    words = re.findall(r"[a-z]+", text)
+    return {intent: sum(weights.get(word, 0) for word in words) for intent, weights in INTENT_KEYWORDS.items()}
+
+
+def confident_intent(scores: dict, candidates: list) -> Optional[str]:
+    ranked = sorted(candidates, key=lambda intent: scores[intent], reverse=True)
+    if scores[ranked[0]] == 0 or (len(ranked) > 1 and scores[ranked[0]] - scores[ranked[1]] < MIN_MARGIN):
+        return None
+    return ranked[0]
+
+
+def time_unit(token: str) -> str:
+    if token.startswith("mo"):
+        return "mo"
+    if token.startswith("m"):
+        return "min"
+    return token[0]
+
+
+def parse_time_range(text: str) -> str:
+    match = TIME_RANGE.search(text)
+    if match:
+        amount, unit = int(match.group(1)), time_unit(match.group(2))
+        if unit in ("min", "h"):
+            return "1h"
+        days = amount * TIME_UNIT_DAYS[unit]
+        return "1d" if days <= 1 else "7d" if days <= 7 else "30d"
+    if "hour" in text:
+        return "1h"
+    if "month" in text:
+        return "30d"
+    if "week" in text:
+        return "7d"
+    return "1d"
+
+
+def parse_days(text: str) -> int:
+    match = TIME_RANGE.search(text)
+    if match:
+        amount, unit = int(match.group(1)), time_unit(match.group(2))
+        return max(1, min(365, math.ceil(amount * TIME_UNIT_DAYS[unit])))
+    if "month" in text:
+        return 30
+    if "year" in text:
+        return 365
+    return 7
+
+
+def parse_metric(text: str) -> str:
+    for metric, phrases in TREND_METRIC_SYNONYMS.items():
+        if any(phrase in text for phrase in phrases):
+            return metric
+    return "floorPrice"
+
+
+def parse_top(text: str) -> int:
+    match = TOP_N.search(text)
+    if match:
+        return max(1, min(50, int(match.group(1) or match.group(2))))
+    return 10
+
+
+def route_address_query(query: str, address: str) -> Optional[tuple]:
+    remainder = query.replace(address, " ").lower()
+    scores = score_intents(remainder)
+    if not re.search(r"[a-z]", remainder):
+        # A bare address: a mint we already store is an NFT lookup, anything else is treated as a wallet
+        if get_nft_metadata_from_mongodb_by_address(address):
+            return "get_nft_metadata_by_address", {"address": address}
+        return "get_nfts_by_owner", {"address": address}
+
+    intent = confident_intent(scores, ["get_nfts_by_owner", "get_nft_metadata_by_address"])
+    if intent is None:
+        return None
+    return intent, {"address": address}
+
+
+def route_name_query(query: str) -> Optional[tuple]:
+    match = NAME_QUERY.search(query)
+    if not match:
+        return None
+    name = match.group(1).strip(" :'\"")
+    if not name or NOT_NAME_WORDS & set(re.findall(r"[a-z]+", name.lower())):
+        return None
+    return "get_nft_metadata_by_name", {"nft_name": name + " " + match.group(2).replace(" ", "")}
+
+
+def collection_name_match(patterns: list, query: str) -> Optional[str]:
+    for pattern in patterns:
+        match = pattern.search(query)
+        if match:
+            name = match.group(1).strip(" '\"")
+            if name and not NOT_COLLECTION_WORDS & set(re.findall(r"[a-z]+", name.lower())):
+                return name
+            return None
+    return None
+
+
+def route_trend_query(query: str) -> Optional[tuple]:
+    collection_name = collection_name_match(TREND_COLLECTION, query)
+    if collection_name:
+        text = query.lower()
+        return "get_collection_trend", {"collection_name": collection_name,
+                                        "metric": parse_metric(text), "days": parse_days(text)}
+    return None
+
+
+def route_stats_query(query: str) -> Optional[tuple]:
+    collection_name = collection_name_match(STATS_COLLECTION, query)
+    if collection_name:
+        return "get_collection_stats", {"collection_name": collection_name}
+    return None
+
+
+@traced("route_query")
+def route_query(query: str) -> Optional[tuple]:
+    # Returns (function_name, function_args) when the intent is unambiguous, otherwise None for the LLM
+    with _stats_lock:
+        _stats["queries"] += 1
+
+    query = query.strip()
+    text = query.lower()
+    addresses = BASE58_ADDRESS.findall(query)
+
+    if len(addresses) > 1:
+        route = None
+    elif addresses:
+        route = route_address_query(query, addresses[0])
+    elif len(NFT_EDITION.findall(query)) > 1:
+        # Several NFTs in one question ("#12 and #40") need the LLM to decide what is being asked
+        route = None
+    elif NFT_EDITION.search(query):
+        route = route_name_query(query)
+    else:
+        scores = score_intents(text)
+        intent = confident_intent(scores, ["get_collection_stats", "get_popular_collections", "get_collection_trend"])
+        if intent == "get_popular_collections":
+            route = intent, {"time_range": parse_time_range(text), "top": parse_top(text)}
+        elif intent == "get_collection_stats":
+            route = route_stats_query(query)
+        elif intent == "get_collection_trend":
+            route = route_trend_query(query)
+        else:
+            route = None
+
+    set_attributes(intent=route[0] if route else None)
+    if route:
+        with _stats_lock:
+            _stats["routed"] += 1
+        print(f"Routed locally to {route[0]} with {route[1]}")
+    return route
+
+
+def record_llm_routing(seconds: float):
+    with _stats_lock:
+        _stats["llm_calls"] += 1
+        _stats["llm_seconds"] += seconds
+
+
+def router_stats() -> dict:
+    with _stats_lock:
+        average_llm_seconds = _stats["llm_seconds"] / _stats["llm_calls"] if _stats["llm_calls"] else 0.0
+        return {
+            "queries": _stats["queries"],
+            "routed": _stats["routed"],
+            "hit_rate": _stats["routed"] / _stats["queries"] if _stats["queries"] else 0.0,
+            "saved_seconds": _stats["routed"] * average_llm_seconds,
+        }
@@ -0,0 +1,104 @@
+import json
+import os
+from datetime import datetime
+from typing import Optional
+import pyarrow as pa
+import pyarrow.parquet as pq
+import streamlit as st
+from bson import Binary
+from mongodb_functions import iter_collection_nft_metadata, get_nft_blob_documents, restore_nft_metadata
+
+# Outside the checkout, so a fresh deployment or benchmark run never restores files left in the repo tree
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "vtopia", "snapshots")
+SNAPSHOT_BATCH_ROWS = 5000
+SNAPSHOT_COMPRESSION = "zstd"
+# Scalar show_nft_data fields become typed columns; nested ones are kept as JSON text
+SCALAR_COLUMNS = {
+    "mint_address": pa.string(), "name": pa.string(), "edition": pa.int64(), "symbol": pa.string(),
+    "description": pa.string(), "image": pa.string(), "collection": pa.string(), "website": pa.string(),
+    "burnt": pa.bool_(), "interface": pa.string(), "mutable": pa.bool_(),
+}
+JSON_COLUMNS = ("traits", "creators", "royalty", "supply")
+# show_nft_data name -> compact document field, where they differ
+DOCUMENT_FIELDS = {"mint_address": "id", "collection": "collection_address"}
+
+
+def snapshot_dir() -> str:
+    return st.secrets.get("snapshot_dir") or os.environ.get("VTOPIA_SNAPSHOT_DIR") or DEFAULT_SNAPSHOT_DIR
+
+
+def snapshot_path(collectionId: str) -> str:
+    return os.path.join(snapshot_dir(), f"{collectionId}.parquet")
+
+
+def has_collection_snapshot(collectionId: str) -> bool:
+    return os.path.exists(snapshot_path(collectionId))
+
+
+def snapshot_rows(documents: list, blobs: dict) -> list:
+    rows = []
+    for doc in documents:
+        row = {column: doc.get(DOCUMENT_FIELDS.get(column, column)) for column in SCALAR_COLUMNS}
+        for column in JSON_COLUMNS:
+            row[column] = json.dumps(doc[column]) if column in doc else None
+        row["blob"] = bytes(blobs[doc["id"]]) if doc["id"] in blobs else None
+        rows.append(row)
+    return rows
+
+
+def export_collection_snapshot(collectionId: str, collection_name: str, collection_info_id) -> Optional[str]:
+    # One Parquet file per collection, written to a temp file and swapped in so readers never see a partial snapshot
+    rows = []
+    batch = []
+    for doc in iter_collection_nft_metadata(collection_info_id, SNAPSHOT_BATCH_ROWS):
+        batch.append(doc)
+        if len(batch) == SNAPSHOT_BATCH_ROWS:
+            rows.extend(snapshot_rows(batch, get_nft_blob_documents([doc["id"] for doc in batch])))
+            batch = []
+    if batch:
+        rows.extend(snapshot_rows(batch, get_nft_blob_documents([doc["id"] for doc in batch])))
+    if not rows:
+        return None
+
+    schema = pa.schema(
+        [(column, column_type) for column, column_type in SCALAR_COLUMNS.items()]
+        + [(column, pa.string()) for column in JSON_COLUMNS]
+        + [("blob", pa.binary())],
+        metadata={"collectionName": collection_name, "helloMoonCollectionId": collectionId,
+                  "exported_at": datetime.now().isoformat()},
+    )
+    table = pa.Table.from_pylist(rows, schema=schema)
+
+    path = snapshot_path(collectionId)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pq.write_table(table, path + ".tmp", compression=SNAPSHOT_COMPRESSION, row_group_size=SNAPSHOT_BATCH_ROWS)
+    os.replace(path + ".tmp", path)
+    print(f"Exported {table.num_rows} NFTs of {collection_name} to {path}")
+    return path
+
+
+def snapshot_documents(batch: pa.RecordBatch) -> tuple:
+    # Inverse of snapshot_rows: compact NFT documents plus nft_blobs documents
+    documents, blobs = [], []
+    for row in batch.to_pylist():
+        doc = {DOCUMENT_FIELDS.get(column, column): row[column] for column in SCALAR_COLUMNS
+               if row.get(column) is not None}
+        doc.pop("edition", None)
+        for column in JSON_COLUMNS:
+            if row.get(column) is not None:
+                doc[column] = json.loads(row[column])
+        documents.append(doc)
+        if row.get("blob") is not None:
+            blobs.append({"id": doc["id"], "blob": Binary(row["blob"])})
+    return documents, blobs
+
+
+def restore_collection_snapshot(collectionId: str, collection_info_id) -> int:
+    # Bulk-loads a collection from its snapshot instead of re-crawling HelloMoon and Helius
+    parquet_file = pq.ParquetFile(snapshot_path(collectionId), memory_map=True)
+    restored = 0
+    for batch in parquet_file.iter_batches(batch_size=SNAPSHOT_BATCH_ROWS):
+        documents, blobs = snapshot_documents(batch)
+        restore_nft_metadata(documents, blobs, collection_info_id)
+        restored += len(documents)
+    return restored
@@ -0,0 +1,116 @@
+import time
+from datetime import datetime, timedelta
+from hellomoon_functions import fetch_collection_stats
+from magiceden_functions import popular_collections
+from mongodb_functions import STATS_TIERS, STATS_METRICS, insert_stats_points, claim_stats_job, rollup_collection_stats, get_stats_watermark, get_stats_points, has_stats_points, get_known_collections
+from name_functions import collection_key
+from resolver_functions import resolve_collection
+from tracing_functions import span
+
+STATS_COLLECTION_INTERVAL = timedelta(minutes=15)
+STATS_POLL_SECONDS = 60
+MAX_TRACKED_COLLECTIONS = 200
+POPULAR_TIME_RANGES = ("1d", "7d")
+DEFAULT_TREND_DAYS = 7
+
+
+def hellomoon_stats_point(stats: dict, now: datetime) -> dict:
+    point = {"ts": now, "meta": {"collection": collection_key(stats["collectionName"]), "source": "hellomoon"},
+             "name": stats["collectionName"]}
+    for metric in STATS_METRICS:
+        if stats.get(metric) is not None:
+            point[metric] = stats[metric]
+    if stats.get("one_day", {}).get("volume") is not None:
+        point["volume_1d"] = stats["one_day"]["volume"]
+    return point
+
+
+def magiceden_stats_point(collection: dict, now: datetime) -> dict:
+    return {"ts": now, "meta": {"collection": collection_key(collection["name"]), "source": "magiceden"},
+            "name": collection["name"], "floorPrice": collection["floorPrice"]}
+
+
+def record_collection_stats(stats: dict):
+    # Stats a user just fetched are a free sample for the time series
+    insert_stats_points([hellomoon_stats_point(stats, datetime.now())])
+
+
+def collect_stats() -> int:
+    # One snapshot of every collection we know of (HelloMoon) and of the current popular rankings (Magic Eden)
+    now = datetime.now()
+    points = []
+    with span("stats.collect") as current:
+        for collectionId, collection_name in get_known_collections()[:MAX_TRACKED_COLLECTIONS]:
+            try:
+                points.append(hellomoon_stats_point(fetch_collection_stats(collectionId), now))
+            except Exception as e:
+                print(f"Failed to snapshot stats for {collection_name}: {e}")
+
+        seen = set()
+        for time_range in POPULAR_TIME_RANGES:
+            try:
+                ranking = popular_collections(time_range)
+            except Exception as e:
+                print(f"Failed to snapshot {time_range} popular collections: {e}")
+                continue
+            for collection in ranking:
+                if collection.get("name") and collection.get("floorPrice") is not None and collection["name"] not in seen:
+                    seen.add(collection["name"])
+                    points.append(magiceden_stats_point(collection, now))
+
+        insert_stats_points(points)
+        current.set(points=len(points))
+    return len(points)
+
+
+def rollup_stats(now: datetime):
+    # Only whole buckets are rolled up: raw into finished hours, then hourly into finished days
+    with span("stats.rollup") as current:
+        hourly = rollup_collection_stats("raw", "hourly", now.replace(minute=0, second=0, microsecond=0))
+        through = get_stats_watermark("hourly")
+        daily = 0
+        if through is not None:
+            daily = rollup_collection_stats("hourly", "daily", through.replace(hour=0, minute=0, second=0, microsecond=0))
+        current.set(hourly=hourly, daily=daily)
+
+
+def run_stats_collector():
+    while True:
+        try:
+            if claim_stats_job("collector", STATS_COLLECTION_INTERVAL):
+                collect_stats()
+                rollup_stats(datetime.now())
+        except Exception as e:
+            print(f"Stats collector error: {e}")
+        time.sleep(STATS_POLL_SECONDS)
+
+
+def get_collection_trend(collection_name: str, metric: str = "floorPrice", days: int = DEFAULT_TREND_DAYS,
+                         save_alias: bool = True) -> dict:
+    # Served entirely from the store: the coarsest tier that still covers the window, then finer tiers
+    # from each watermark onwards, so the most recent points are never waiting on a rollup
+    key = collection_key(collection_name)
+    if not has_stats_points(key):
+        collectionId, retrievedCollectionName = resolve_collection(collection_name, save_alias)
+        key = collection_key(retrievedCollectionName)
+
+    now = datetime.now()
+    start = now - timedelta(days=days)
+    tiers = list(STATS_TIERS)
+    coarsest = next(i for i, tier in enumerate(tiers)
+                    if STATS_TIERS[tier][2] is None or days * 24 * 60 * 60 <= STATS_TIERS[tier][2])
+
+    points = []
+    for tier in reversed(tiers[:coarsest + 1]):
+        end = now if tier == "raw" else (get_stats_watermark(tier) or start)
+        if end > start:
+            points += [{"ts": point["ts"], "source": point["meta"]["source"], "value": point[metric],
+                        "tier": tier, **({"min": point["floorPrice_min"], "max": point["floorPrice_max"]}
+                                         if metric == "floorPrice" and "floorPrice_min" in point else {})}
+                       for point in get_stats_points(tier, key, metric, start, end)]
+            start = end
+
+    if not points:
+        return {"Error": f"No {metric} history stored for {collection_name} yet; it is snapshotted every "
+                         f"{int(STATS_COLLECTION_INTERVAL.total_seconds() // 60)} minutes once looked up"}
+    return {"collection": key, "metric": metric, "days": days, "points": points}
@@ -0,0 +1,216 @@
+import contextlib
+import functools
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pymongo import monitoring
+
+# Prometheus histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+MAX_TRACE_SPANS = 500
+
+# One JSON object per finished span on stderr, independent of the root logger's configuration
+logger = logging.getLogger("vtopia.trace")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_local = threading.local()
+_metrics = {}
+_metrics_lock = threading.Lock()
+_metrics_server = None
+
+
+class Span:
+    def __init__(self, name: str, attributes: dict, depth: int):
+        self.name = name
+        self.attributes = attributes
+        self.depth = depth
+        self.start = time.perf_counter()
+        self.end = None
+        self.error = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+class Trace:
+    # The spans recorded on one thread between start_trace and its exit, e.g. one Submit
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.spans = []
+
+    def waterfall(self) -> list:
+        return [{"span": "  " * span.depth + span.name, "start_ms": (span.start - self.start) * 1000,
+                 "end_ms": (span.start - self.start + span.duration) * 1000,
+                 "duration_ms": span.duration * 1000, "error": span.error,
+                 "attributes": json.dumps(span.attributes, default=str)}
+                for span in self.spans]
+
+
+def _stack() -> list:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def current_span():
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+def set_attributes(**attributes):
+    span = current_span()
+    if span is not None:
+        span.set(**attributes)
+
+
+@contextlib.contextmanager
+def start_trace(name: str):
+    trace = Trace(name)
+    previous = getattr(_local, "trace", None)
+    _local.trace = trace
+    try:
+        with span(name):
+            yield trace
+    finally:
+        _local.trace = previous
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    stack = _stack()
+    current = Span(name, attributes, len(stack))
+    trace = getattr(_local, "trace", None)
+    if trace is not None and len(trace.spans) < MAX_TRACE_SPANS:
+        trace.spans.append(current)
+    stack.append(current)
+    try:
+        yield current
+    except Exception as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        stack.pop()
+        current.end = time.perf_counter()
+        record_span(current)
+
+
+def traced(name: str = None, **attributes):
+    def decorator(function):
+        span_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(span_name, **attributes):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_span(finished: Span):
+    duration = finished.duration
+    with _metrics_lock:
+        metric = _metrics.setdefault(finished.name, {"buckets": [0] * len(LATENCY_BUCKETS), "sum": 0.0,
+                                                     "count": 0, "errors": 0})
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if duration <= bound:
+                metric["buckets"][i] += 1
+        metric["sum"] += duration
+        metric["count"] += 1
+        if finished.error:
+            metric["errors"] += 1
+
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({"span": finished.name, "duration_ms": round(duration * 1000, 2),
+                                "depth": finished.depth, "error": finished.error, **finished.attributes},
+                               default=str))
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    # Times every command the client sends, so each mongodb_functions query shows up without wrapping it by hand.
+    # Events fire on the calling thread, which puts the span in that thread's trace.
+
+    def __init__(self):
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        attributes = {"collection": collection if isinstance(collection, str) else None}
+        current = Span(f"mongo.{event.command_name}", attributes, len(_stack()))
+        trace = getattr(_local, "trace", None)
+        if trace is not None and len(trace.spans) < MAX_TRACE_SPANS:
+            trace.spans.append(current)
+        with self._lock:
+            self._started[(event.connection_id, event.request_id)] = current
+
+    def _finish(self, event, error=None):
+        with self._lock:
+            current = self._started.pop((event.connection_id, event.request_id), None)
+        if current is None:
+            return
+        current.end = current.start + event.duration_micros / 1e6
+        current.error = error
+        record_span(current)
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event, event.failure.get("codeName", "CommandFailed"))
+
+
+def prometheus_metrics() -> str:
+    lines = ["# HELP vtopia_span_duration_seconds Time spent in each traced stage",
+             "# TYPE vtopia_span_duration_seconds histogram"]
+    with _metrics_lock:
+        metrics = {name: {**metric, "buckets": list(metric["buckets"])} for name, metric in _metrics.items()}
+    for name, metric in sorted(metrics.items()):
+        for bound, count in zip(LATENCY_BUCKETS, metric["buckets"]):
+            lines.append(f'vtopia_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {count}')
+        lines.append(f'vtopia_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {metric["count"]}')
+        lines.append(f'vtopia_span_duration_seconds_sum{{span="{name}"}} {metric["sum"]}')
+        lines.append(f'vtopia_span_duration_seconds_count{{span="{name}"}} {metric["count"]}')
+    lines += ["# HELP vtopia_span_errors_total Traced stages that raised or failed",
+              "# TYPE vtopia_span_errors_total counter"]
+    for name, metric in sorted(metrics.items()):
+        lines.append(f'vtopia_span_errors_total{{span="{name}"}} {metric["errors"]}')
+    return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0"):
+    # Serves /metrics from its own thread, outside Streamlit's server
+    global _metrics_server
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = prometheus_metrics().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    with _metrics_lock:
+        if _metrics_server is None:
+            _metrics_server = ThreadingHTTPServer((host, port), Handler)
+            _metrics_server.daemon_threads = True
+            threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+    return _metrics_server
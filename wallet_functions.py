@@ -0,0 +1,77 @@
+import threading
+import bson
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from cache_functions import TTLCache
+from helius_functions import get_nfts_by_owner_page, iter_nfts_by_owner
+from mongodb_functions import get_wallet_snapshot_page, update_wallet_snapshot
+
+WALLET_CARDS_PER_VIEW = 24
+WALLET_SNAPSHOT_TTL = timedelta(minutes=5)
+# Snapshots live in one document, so they are capped by encoded size well under Mongo's 16MB document limit
+MAX_SNAPSHOT_BYTES = 12 * 1024 * 1024
+
+wallet_pages_cache = TTLCache(ttl=60, stale_ttl=0, maxsize=256)
+_prefetch_executor = ThreadPoolExecutor(max_workers=4)
+_refreshing_owners = set()
+_refreshing_owners_lock = threading.Lock()
+
+
+def get_live_wallet_page(address: str, page: int) -> list:
+    # One view's worth of cards, fetched straight from Helius with a matching page size
+    return wallet_pages_cache.get_or_fetch(
+        (address, page), lambda: get_nfts_by_owner_page(address, page, WALLET_CARDS_PER_VIEW)
+    )
+
+
+def get_wallet_page(address: str, page: int) -> tuple:
+    # Returns (nfts, has_next_page), served from the owner's snapshot when there is one
+    snapshot = get_wallet_snapshot_page(address, (page - 1) * WALLET_CARDS_PER_VIEW, WALLET_CARDS_PER_VIEW)
+    if snapshot is None:
+        refresh_wallet_snapshot(address)
+        nfts = get_live_wallet_page(address, page)
+        return nfts, len(nfts) == WALLET_CARDS_PER_VIEW
+
+    if datetime.now() - snapshot["fetched_at"] > WALLET_SNAPSHOT_TTL:
+        refresh_wallet_snapshot(address)
+    if snapshot.get("truncated") and (page - 1) * WALLET_CARDS_PER_VIEW >= snapshot["asset_count"]:
+        # Past the end of a capped snapshot: the rest of a very large wallet is paged live
+        nfts = get_live_wallet_page(address, page)
+        return nfts, len(nfts) == WALLET_CARDS_PER_VIEW
+    return snapshot["assets"], snapshot.get("truncated") or page * WALLET_CARDS_PER_VIEW < snapshot["asset_count"]
+
+
+def prefetch_wallet_page(address: str, page: int):
+    _prefetch_executor.submit(get_wallet_page, address, page)
+
+
+def refresh_wallet_snapshot(address: str):
+    with _refreshing_owners_lock:
+        if address in _refreshing_owners:
+            return
+        _refreshing_owners.add(address)
+    threading.Thread(target=_refresh_wallet_snapshot, args=(address,), daemon=True).start()
+
+
+def _refresh_wallet_snapshot(address: str):
+    try:
+        assets = []
+        size = 0
+        truncated = False
+        for page in iter_nfts_by_owner(address):
+            for asset in page:
+                size += len(bson.encode({"asset": asset}))
+                if size > MAX_SNAPSHOT_BYTES:
+                    truncated = True
+                    break
+                assets.append(asset)
+            if truncated:
+                print(f"Wallet {address} is over the {MAX_SNAPSHOT_BYTES // (1024 * 1024)}MB snapshot cap; "
+                      f"storing its first {len(assets)} assets")
+                break
+        update_wallet_snapshot(address, assets, truncated)
+    except Exception as e:
+        print(f"Failed to refresh wallet snapshot for {address}: {e}")
+    finally:
+        with _refreshing_owners_lock:
+            _refreshing_owners.discard(address)